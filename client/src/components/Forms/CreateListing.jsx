@@ -10,6 +10,7 @@ import {
 } from '@mui/icons-material';
 import { useNavigate, useParams } from 'react-router-dom';
 import NavBar from '../Layout/NavBar';
+import LocationPicker from '../Map/LocationPicker';
 
 const CreateListing = () => {
   const navigate = useNavigate();
@@ -20,6 +21,7 @@ const CreateListing = () => {
   const [error, setError] = useState('');
   const [imageMode, setImageMode] = useState('url'); 
   const [selectedFile, setSelectedFile] = useState(null);
+  const [coords, setCoords] = useState(null); // Optional pin for "near me" search
   
   const [formData, setFormData] = useState({
     title: '',
@@ -39,6 +41,9 @@ const CreateListing = () => {
           if (!response.ok) throw new Error('Failed to fetch item');
           const data = await response.json();
           setFormData(data);
+          if (data.latitude != null && data.longitude != null) {
+            setCoords({ lat: data.latitude, lng: data.longitude });
+          }
         } catch (err) {
           console.error("Fetch error:", err); // Resolves ESLint 'err' unused
           setError('Could not fetch item details. Please check your connection.');
@@ -66,6 +71,10 @@ const CreateListing = () => {
     data.append('price', formData.price);
     data.append('category', formData.category);
     data.append('location', formData.location);
+    if (coords) {
+      data.append('lat', coords.lat);
+      data.append('lng', coords.lng);
+    }
 
     if (imageMode === 'file' && selectedFile) {
       data.append('file', selectedFile);
@@ -208,6 +217,11 @@ const CreateListing = () => {
                 InputProps={{ startAdornment: <InputAdornment position="start"><LocationOn color="primary"/></InputAdornment> }}
               />
 
+              <Box>
+                <Typography variant="subtitle2" sx={{ fontWeight: 700 }}>Pin on Map (Optional)</Typography>
+                <LocationPicker coords={coords} setCoords={setCoords} />
+              </Box>
+
               <Divider sx={{ my: 1 }} />
 
               <Stack direction="row" spacing={2}>
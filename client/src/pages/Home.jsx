@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react'; 
 import { 
   Box, Container, Grid, Typography, TextField, 
-  InputAdornment, Chip, Stack, CircularProgress, Fab, Tooltip 
+  InputAdornment, Chip, Stack, CircularProgress, Fab, Tooltip, Button 
 } from '@mui/material';
 import { Search, ErrorOutline, Add as AddIcon } from '@mui/icons-material';
 import { useNavigate } from 'react-router-dom';
@@ -24,37 +24,70 @@ const Home = () => {
   // API Configuration - Define the base URL here for easy changes
   const API_BASE_URL = 'http://127.0.0.1:5000'; 
 
+  // Pages come from the server already filtered; the search box and
+  // category chips are sent as query parameters.
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [debouncedQuery, setDebouncedQuery] = useState('');
+
+  useEffect(() => {
+    const timer = setTimeout(() => setDebouncedQuery(searchQuery.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
+  const buildUrl = (cursor) => {
+    const params = new URLSearchParams();
+    if (filter !== 'All') params.set('category', filter);
+    if (debouncedQuery) params.set('q', debouncedQuery);
+    if (cursor) params.set('cursor', cursor);
+    const path = debouncedQuery ? '/listings/search' : '/listings';
+    return `${API_BASE_URL}${path}?${params.toString()}`;
+  };
+
+  const fetchPage = async (cursor) => {
+    const response = await fetch(buildUrl(cursor));
+    if (!response.ok) {
+      throw new Error(`Server responded with ${response.status}`);
+    }
+    const data = await response.json();
+    return { data, cursor: response.headers.get('X-Next-Cursor') };
+  };
+
   useEffect(() => {
+    let cancelled = false;
     const fetchListings = async () => {
       try {
         setLoading(true);
-        // Using the full absolute address to avoid 404/Not Found errors
-        const response = await fetch(`${API_BASE_URL}/listings`);
-        
-        if (!response.ok) {
-           throw new Error(`Server responded with ${response.status}: Not Found`);
-        }
-        
-        const data = await response.json();
-        setItems(data);
+        const page = await fetchPage(null);
+        if (cancelled) return;
+        setItems(page.data);
+        setNextCursor(page.cursor);
         setError(null); // Clear any previous errors
       } catch (err) {
         console.error("Fetch error:", err);
-        setError(err.message);
+        if (!cancelled) setError(err.message);
       } finally {
-        setLoading(false);
+        if (!cancelled) setLoading(false);
       }
     };
 
     fetchListings();
-  }, []);
+    return () => { cancelled = true; };
+  }, [filter, debouncedQuery]);
 
-  // Filter logic: Handles both Category chips and Search bar
-  const filteredItems = items.filter(item => {
-    const matchesFilter = filter === 'All' || item.category === filter;
-    const matchesSearch = item.title.toLowerCase().includes(searchQuery.toLowerCase());
-    return matchesFilter && matchesSearch;
-  });
+  const loadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const page = await fetchPage(nextCursor);
+      setItems((current) => [...current, ...page.data]);
+      setNextCursor(page.cursor);
+    } catch (err) {
+      console.error("Fetch error:", err);
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   return (
     <Box sx={{ minHeight: '100vh', bgcolor: 'background.default' }}>
@@ -110,7 +143,7 @@ const Home = () => {
         )}
 
         {/* Empty State */}
-        {!loading && !error && filteredItems.length === 0 && (
+        {!loading && !error && items.length === 0 && (
           <Typography variant="h6" textAlign="center" color="text.secondary" py={10}>
             No listings found matching your search.
           </Typography>
@@ -118,12 +151,21 @@ const Home = () => {
 
         {/* Results Grid - Now using the ListingCard component */}
         <Grid container spacing={3}>
-          {!loading && !error && filteredItems.map((item) => (
+          {!loading && !error && items.map((item) => (
             <Grid item xs={12} sm={6} md={4} key={item.id}>
               <ListingCard item={item} />
             </Grid>
           ))}
         </Grid>
+
+        {/* Next page, following the server's X-Next-Cursor */}
+        {!loading && !error && nextCursor && (
+          <Box display="flex" justifyContent="center" mt={4}>
+            <Button variant="outlined" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </Button>
+          </Box>
+        )}
       </Container>
 
       {/* Floating Action Button - Only visible if logged in */}
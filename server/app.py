@@ -1,12 +1,31 @@
 import os
+import base64
 import secrets
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, Response, request, jsonify, abort, stream_with_context
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from flask_mail import Mail, Message
+from flask_jwt_extended import JWTManager, create_access_token, current_user, get_jwt, get_jwt_identity, jwt_required
+from flask_mail import Mail
+from flask_migrate import Migrate, upgrade
 from werkzeug.utils import secure_filename
+import search
+import geo
+import images
+from cache import ResponseCache, add_cache_tags
+from passwords import HasherSaturated, PasswordHasher, SlidingWindowLimiter
+import outbox
+from chat import ChatHub
+import bulk
+import storage
+import encoding
+from identity import RevocationList, TTLCache
+from metrics import Metrics
+from models import db, User, Listing, OutboxEmail, Conversation, ConversationMember, ChatMessage, RevokedToken
+from sqlalchemy import tuple_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.expression import UnaryExpression
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta
 
 # --- CONFIGURATION ---
@@ -18,59 +37,327 @@ def home():
         "message": "Welcome to the TalaLink API",
         "endpoints": ["/listings", "/signup", "/login", "/profile"]
     })
-CORS(app) 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///talalink.db'
+CORS(app, expose_headers=['X-Next-Cursor']) 
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///talalink.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL') # GETs read here when set
+app.config['DATABASE_REPLICA_LAG_WINDOW'] = float(os.environ.get('DATABASE_REPLICA_LAG_WINDOW', 2)) # seconds
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+
+def _engine_options(url):
+    return storage.engine_options(
+        url,
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pool_recycle=app.config['DB_POOL_RECYCLE'],
+    )
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+if app.config['DATABASE_REPLICA_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {storage.REPLICA_BIND: {
+        'url': app.config['DATABASE_REPLICA_URL'],
+        **_engine_options(app.config['DATABASE_REPLICA_URL']),
+    }}
 app.config['JWT_SECRET_KEY'] = 'thika_artisan_secret_key_2026' 
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
+app.config['BCRYPT_LOG_ROUNDS'] = 12 # Existing hashes are upgraded on next login
+app.config['HASH_WORKERS'] = 4
+app.config['HASH_QUEUE_DEPTH'] = 16
+app.config['HASH_TIMEOUT'] = 5
+app.config['HASH_IP_LIMIT'] = (int(os.environ.get('HASH_IP_LIMIT', 20)), 60) # attempts per seconds, signup + login
+app.config['LOGIN_ACCOUNT_LIMIT'] = (int(os.environ.get('LOGIN_ACCOUNT_LIMIT', 5)), 60)
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
+app.config['UPLOAD_URL'] = 'http://localhost:5000/static/uploads'
+app.config['IMAGE_WORKERS'] = 2
+app.config['LISTINGS_DEFAULT_LIMIT'] = 20
+app.config['LISTINGS_MAX_LIMIT'] = 100
+app.config['PRICE_SEEK_ROWS'] = 1000 # Price ranges up to this size are read from ix_listing_price
+app.config['NEARBY_MAX_RADIUS_KM'] = 100
+app.config['NEARBY_FIRST_RING_KM'] = 0.5 # Nearby search widens x4 from here until it has a page
+app.config['BULK_BATCH_SIZE'] = 500
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 1024
+app.config['RESPONSE_CACHE_MAX_BYTES'] = 32 * 1024 * 1024
+app.config['RESPONSE_CACHE_TTL'] = 30 # seconds a write from another process may go unseen
+app.config['COMPRESS_MIN_BYTES'] = 1024 # Smaller bodies are sent uncompressed
+app.config['QUERY_COUNT_HEADER'] = os.environ.get('QUERY_COUNT_HEADER') == '1' # X-Query-Count, for bench/
+app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 500))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR') # Unset disables profiling
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN') # X-Profile value that forces a profile; unset ignores the header
+app.config['PROFILE_MAX_FILES'] = 100 # Older .prof files are deleted
 
 # Email Config (Replace with your actual SMTP details)
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = 'your-email@gmail.com'
-app.config['MAIL_PASSWORD'] = 'your-app-password' 
+# For local testing point MAIL_SERVER/MAIL_PORT at a stand-in server, e.g.
+# `python -m aiosmtpd -n -l localhost:1025` with MAIL_USE_TLS=0.
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '1') == '1'
+app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME') # Unset skips SMTP AUTH
+app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
+app.config['MAIL_DEFAULT_SENDER'] = 'noreply@talalink.com'
+app.config['OUTBOX_BATCH_SIZE'] = 50
+app.config['OUTBOX_POLL_INTERVAL'] = 2
+app.config['OUTBOX_MAX_ATTEMPTS'] = 8
+app.config['OUTBOX_SENDER'] = os.environ.get('OUTBOX_SENDER', '1') == '1' # 0 when another process drains the outbox
+app.config['CHAT_QUEUE_SIZE'] = 256 # Undelivered events per connection before it is dropped
+app.config['CHAT_MAX_MESSAGE_LENGTH'] = 4000
+app.config['IDENTITY_CACHE_MAX_ENTRIES'] = 10_000
+app.config['IDENTITY_CACHE_TTL'] = 60 # seconds another process may serve a stale profile
+app.config['REVOCATION_BLOOM_CAPACITY'] = 100_000
+app.config['REVOCATION_BLOOM_ERROR_RATE'] = 0.001
+app.config['REVOCATION_SYNC_INTERVAL'] = 5 # seconds until other processes see a logout
 
 # --- INITIALIZATION ---
-db = SQLAlchemy(app)
+db.init_app(app)
+migrate = Migrate(
+    app, db,
+    directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'),
+    # The FTS5 tables are managed by search.py, not the models.
+    include_object=lambda obj, name, type_, reflected, compare_to:
+        not (type_ == 'table' and name.startswith(search.FTS_TABLE)),
+)
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
 mail = Mail(app)
+password_hasher = PasswordHasher(
+    bcrypt,
+    log_rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    workers=app.config['HASH_WORKERS'],
+    queue_depth=app.config['HASH_QUEUE_DEPTH'],
+    timeout=app.config['HASH_TIMEOUT'],
+)
+hash_ip_limiter = SlidingWindowLimiter(*app.config['HASH_IP_LIMIT'])
+login_account_limiter = SlidingWindowLimiter(*app.config['LOGIN_ACCOUNT_LIMIT'])
+chat_hub = ChatHub(queue_size=app.config['CHAT_QUEUE_SIZE'])
+identity_cache = TTLCache(
+    max_entries=app.config['IDENTITY_CACHE_MAX_ENTRIES'],
+    ttl=app.config['IDENTITY_CACHE_TTL'],
+)
+response_cache = ResponseCache(
+    max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+    ttl=app.config['RESPONSE_CACHE_TTL'],
+)
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+image_pipeline = images.ImagePipeline(app.config['UPLOAD_FOLDER'], app.config['IMAGE_WORKERS'])
+
+with app.app_context():
+    for engine in db.engines.values():
+        storage.configure_sqlite(
+            engine,
+            busy_timeout_ms=app.config['SQLITE_BUSY_TIMEOUT_MS'],
+            mmap_size=app.config['SQLITE_MMAP_SIZE'],
+            synchronous=app.config['SQLITE_SYNCHRONOUS'],
+            journal_mode=app.config['SQLITE_JOURNAL_MODE'],
+        )
+    metrics = Metrics(
+        app, db.engines.values(),
+        slow_request_ms=app.config['SLOW_REQUEST_MS'],
+        profile_dir=app.config['PROFILE_DIR'],
+        profile_sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+        profile_token=app.config['PROFILE_TOKEN'],
+        profile_max_files=app.config['PROFILE_MAX_FILES'],
+        query_count_header=app.config['QUERY_COUNT_HEADER'],
+    )
+
+# Registered after metrics so it runs first: metrics see the bytes on the wire.
+@app.after_request
+def compress(response):
+    return encoding.compress_response(response, request.accept_encodings, app.config['COMPRESS_MIN_BYTES'])
 
 # --- MODELS ---
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-    phone_number = db.Column(db.String(20), nullable=True) # For WhatsApp integration
-    is_verified = db.Column(db.Boolean, default=True)
-    verification_token = db.Column(db.String(100), unique=True)
-    listings = db.relationship('Listing', backref='author', lazy=True)
-
-class Listing(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    category = db.Column(db.String(50), nullable=False) # 'Product' or 'Service'
-    location = db.Column(db.String(100), default='Thika Town')
-    image_url = db.Column(db.String(500))
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+# The tables live in models.py; these helpers need their models.
+outbox_sender = outbox.OutboxSender(
+    app, db, OutboxEmail, mail,
+    batch_size=app.config['OUTBOX_BATCH_SIZE'],
+    poll_interval=app.config['OUTBOX_POLL_INTERVAL'],
+    max_attempts=app.config['OUTBOX_MAX_ATTEMPTS'],
+)
+
+@app.before_request
+def start_outbox_sender():
+    # Started by the first request, so it runs in every serving process
+    # (after any worker fork) but not in CLI commands or the reloader's
+    # watcher process.
+    if app.config['OUTBOX_SENDER']:
+        outbox_sender.start()
+revocation_list = RevocationList(
+    db, RevokedToken,
+    capacity=app.config['REVOCATION_BLOOM_CAPACITY'],
+    error_rate=app.config['REVOCATION_BLOOM_ERROR_RATE'],
+    sync_interval=app.config['REVOCATION_SYNC_INTERVAL'],
+)
+
+# --- PAGINATION HELPERS ---
+
+def encode_cursor(created_at, listing_id):
+    raw = f"{created_at.isoformat()}|{listing_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, listing_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+    return datetime.fromisoformat(created_at), int(listing_id)
+
+def parse_limit(value):
+    default = app.config['LISTINGS_DEFAULT_LIMIT']
+    limit = int(value) if value is not None else default
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, app.config['LISTINGS_MAX_LIMIT'])
+
+# --- SERIALIZATION ---
+
+# Every field a listing response carries, author fields included. Reads
+# select exactly these columns through one join and never hydrate models.
+LISTING_COLUMNS = (
+    Listing.id, Listing.title, Listing.description, Listing.price,
+    Listing.category, Listing.location, Listing.image_url, Listing.user_id,
+    Listing.latitude, Listing.longitude,
+    User.phone_number,  # Crucial for frontend contact
+)
+
+def listing_select():
+    """SELECT of LISTING_COLUMNS joined to the author, plus the internal
+    columns used for cursors and image variants."""
+    return (db.select(*LISTING_COLUMNS, Listing.created_at,
+                      Listing.image_hash, Listing.image_status)
+            .join(User, Listing.user_id == User.id))
+
+def unindexed(column):
+    """column behind SQLite's unary +, which keeps the planner off its indexes."""
+    return UnaryExpression(column, operator=operators.custom_op('+'), type_=column.type)
+
+def narrow_price_range(price_filters):
+    """Whether at most PRICE_SEEK_ROWS listings match the price filters.
+
+    Counted on ix_listing_price and stopped at the cap, so the probe is cheap
+    however wide the range is.
+    """
+    cap = app.config['PRICE_SEEK_ROWS']
+    probe = db.select(Listing.id).where(*price_filters).limit(cap + 1).subquery()
+    return db.session.execute(db.select(db.func.count()).select_from(probe)).scalar() <= cap
+
+def listing_to_dict(row, variant='card'):
+    """API shape of a listing row; image_url points at the requested variant
+    once it has been generated and at the original until then."""
+    item = {column.key: row[column.key] for column in LISTING_COLUMNS}
+    item['image_status'] = row['image_status'] or images.STATUS_NONE
+    if row['image_status'] == images.STATUS_READY:
+        relpath = images.variant_relpath(row['image_hash'], variant)
+        item['image_url'] = f"{app.config['UPLOAD_URL']}/{relpath}"
+    return item
+
+def find_nearby(session, lat, lng, radius_km, limit):
+    """(distance_km, row) pairs within radius_km, nearest first.
+
+    Searches outward in rings from NEARBY_FIRST_RING_KM, stopping at the
+    first ring that holds ``limit`` listings. Each ring is one query on the
+    geohash index that ranks its candidates in SQL and returns at most
+    ``limit`` rows, so a dense area is answered from a small ring and the
+    cost does not grow with the listings inside radius_km.
+    """
+    for ring_km in geo.ring_radii(radius_km, app.config['NEARBY_FIRST_RING_KM']):
+        # Ranked on the covering (geohash, latitude, longitude) index; only
+        # the winners are joined to their full rows.
+        nearest = (db.select(Listing.id)
+                   .where(geo.nearby_clause(Listing.geohash, Listing.latitude, Listing.longitude,
+                                            lat, lng, ring_km))
+                   .order_by(geo.approx_distance(Listing.latitude, Listing.longitude, lat, lng))
+                   .limit(limit))
+        stmt = listing_select().where(Listing.id.in_(nearest.scalar_subquery()))
+        matches = []
+        for row in session.execute(stmt).mappings():
+            distance = geo.haversine_km(lat, lng, row['latitude'], row['longitude'])
+            if distance <= ring_km:
+                matches.append((distance, row))
+        if len(matches) >= limit:
+            break
+    matches.sort(key=lambda pair: pair[0])
+    return matches
+
+def listing_format():
+    return encoding.negotiate_format(request.accept_mimetypes)
+
+def listing_collection_response(items):
+    """Stream listing dicts as a JSON array, or as NDJSON for clients that Accept it.
+
+    Under ``response_cache.cached`` (/listings, /listings/search) the stream
+    is buffered into the cache entry, so only uncached routes such as
+    /listings/nearby reach the client incrementally.
+    """
+    fmt = listing_format()
+    body = encoding.stream_ndjson(items) if fmt == 'ndjson' else encoding.stream_json_array(items)
+    response = Response(stream_with_context(body), mimetype=encoding.MIMETYPES[fmt])
+    response.vary.add('Accept')
+    return response
+
+def tag_listing_rows(rows):
+    """Mark a cached response as depending on the authors and pending images of these rows."""
+    add_cache_tags(*{f"user:{row['user_id']}" for row in rows})
+    add_cache_tags(*{f"image:{row['image_hash']}" for row in rows
+                     if row['image_status'] in (images.STATUS_PENDING, images.STATUS_FAILED)})
 
 # --- AUTH ROUTES ---
 
+def too_many_attempts(retry_after):
+    response = jsonify({"error": "Too many attempts. Please try again later."})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+@app.errorhandler(HasherSaturated)
+def hashing_unavailable(e):
+    response = jsonify({"error": "Server is busy. Please try again shortly."})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@jwt.token_in_blocklist_loader
+def token_revoked(jwt_header, jwt_payload):
+    return revocation_list.is_revoked(jwt_payload['jti'])
+
+@jwt.revoked_token_loader
+def revoked_token_response(jwt_header, jwt_payload):
+    return jsonify({"error": "Token has been revoked"}), 401
+
+@jwt.user_lookup_loader
+def load_current_user(jwt_header, jwt_payload):
+    """Snapshot of the token's user as a dict, from identity_cache when possible."""
+    user_id = int(jwt_payload['sub'])
+    user = identity_cache.get(user_id)
+    if user is None:
+        row = db.session.execute(
+            db.select(User.id, User.username, User.email, User.phone_number).where(User.id == user_id)
+        ).mappings().first()
+        if row is None:
+            return None
+        user = dict(row)
+        identity_cache.put(user_id, user)
+    return user
+
+@jwt.user_lookup_error_loader
+def unknown_user_response(jwt_header, jwt_payload):
+    return jsonify({"error": "User not found"}), 401
+
 @app.route('/signup', methods=['POST'])
 def signup():
     data = request.json
+    retry_after = hash_ip_limiter.hit(request.remote_addr)
+    if retry_after:
+        return too_many_attempts(retry_after)
     if User.query.filter_by(email=data['email']).first():
         return jsonify({"error": "Email already exists"}), 400
 
-    hashed_pw = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    hashed_pw = password_hasher.hash(data['password'])
     v_token = secrets.token_urlsafe(32)
 
     new_user = User(
@@ -80,19 +367,20 @@ def signup():
         verification_token=v_token
     )
     db.session.add(new_user)
+    # Queue the verification email in the same transaction; outbox_sender
+    # delivers it off the request path.
+    db.session.add(OutboxEmail(
+        recipient=data['email'],
+        subject='Verify your TalaLink Account',
+        body=f"Verify your account here: http://localhost:3000/verify/{v_token}"
+    ))
     db.session.commit()
-
-    # Send Verification Email
-    try:
-        msg = Message('Verify your TalaLink Account', sender='noreply@talalink.com', recipients=[data['email']])
-        msg.body = f"Verify your account here: http://localhost:3000/verify/{v_token}"
-       # mail.send(msg)
-    except Exception as e:
-        print(f"Mail delivery failed: {e}")
+    outbox_sender.notify()
 
     return jsonify({"message": "Signup successful. Check email to verify."}), 201
 
 @app.route('/verify/<token>', methods=['GET'])
+@storage.use_primary
 def verify_email(token):
     user = User.query.filter_by(verification_token=token).first()
     if not user:
@@ -105,8 +393,19 @@ def verify_email(token):
 @app.route('/login', methods=['POST'])
 def login():
     data = request.json
+    retry_after = (hash_ip_limiter.hit(request.remote_addr)
+                   or login_account_limiter.hit(data['email'].strip().lower()))
+    if retry_after:
+        return too_many_attempts(retry_after)
+
     user = User.query.filter_by(email=data['email']).first()
-    if user and bcrypt.check_password_hash(user.password, data['password']):
+    if user and password_hasher.verify(user.password, data['password']):
+        if password_hasher.needs_rehash(user.password):
+            try:
+                user.password = password_hasher.hash(data['password'])
+                db.session.commit()
+            except HasherSaturated:
+                pass # Upgrade on a later login rather than fail this one
         if not user.is_verified:
             return jsonify({"error": "Please verify your email first"}), 401
         
@@ -117,57 +416,161 @@ def login():
         }), 200
     return jsonify({"error": "Invalid email or password"}), 401
 
+@app.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Revoke the presented token before it expires."""
+    claims = get_jwt()
+    revocation_list.revoke(claims['jti'], current_user['id'], datetime.utcfromtimestamp(claims['exp']))
+    return jsonify({"message": "Logged out"}), 200
+
 # --- USER PROFILE ---
 
 @app.route('/profile', methods=['GET', 'PUT'])
 @jwt_required()
 def handle_profile():
-    user_id = get_jwt_identity()
-    user = User.query.get_or_404(int(user_id))
-    
     if request.method == 'GET':
         return jsonify({
-            "username": user.username,
-            "email": user.email,
-            "phone_number": user.phone_number or ""
+            "username": current_user['username'],
+            "email": current_user['email'],
+            "phone_number": current_user['phone_number'] or ""
         })
     
+    user = db.get_or_404(User, current_user['id'])
     data = request.json
-    user.phone_number = data.get('phone_number', user.phone_number)
-    db.session.commit()
+    phone_number = data.get('phone_number', user.phone_number)
+    if phone_number != user.phone_number:
+        user.phone_number = phone_number
+        db.session.commit()
+        identity_cache.invalidate(user.id)
+        # Listing responses embed the author's phone number.
+        response_cache.invalidate(f"user:{user.id}")
     return jsonify({"message": "Profile updated successfully"})
 
 # --- MARKETPLACE CRUD ---
 
 @app.route('/listings', methods=['GET'])
+@response_cache.cached(variant=listing_format)
 def get_listings():
-    listings = Listing.query.order_by(Listing.created_at.desc()).all()
-    output = []
-    output.extend(
-        {
-            "id": item.id,
-            "title": item.title,
-            "description": item.description,
-            "price": item.price,
-            "category": item.category,
-            "location": item.location,
-            "image_url": item.image_url,
-            "user_id": item.user_id,
-            "phone_number": item.author.phone_number,  # Crucial for frontend contact
-        }
-        for item in listings
-    )
-    return jsonify(output)
+    args = request.args
+    try:
+        limit = parse_limit(args.get('limit'))
+        min_price = float(args['min_price']) if 'min_price' in args else None
+        max_price = float(args['max_price']) if 'max_price' in args else None
+        cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid pagination or filter parameters"}), 400
+
+    price_filters = []
+    if min_price is not None:
+        price_filters.append(Listing.price >= min_price)
+    if max_price is not None:
+        price_filters.append(Listing.price <= max_price)
+    created_at, listing_id = Listing.created_at, Listing.id
+    if price_filters and db.engine.dialect.name == 'sqlite' and narrow_price_range(price_filters):
+        # Walking the (created_at, id) index would step over every listing
+        # outside the range; seek the price index and sort the few matches.
+        # Unary + on a timestamp is SQLite-only; other planners cost the
+        # price index themselves.
+        created_at, listing_id = unindexed(created_at), unindexed(listing_id)
+
+    stmt = listing_select().where(*price_filters)
+    if args.get('category'):
+        stmt = stmt.where(Listing.category == args['category'])
+    if args.get('location'):
+        stmt = stmt.where(Listing.location == args['location'])
+    if cursor is not None:
+        stmt = stmt.where(tuple_(created_at, listing_id) < cursor)
+
+    # Fetch one extra row to learn whether another page exists.
+    stmt = stmt.order_by(created_at.desc(), listing_id.desc()).limit(limit + 1)
+    rows = db.session.execute(stmt).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    add_cache_tags('listings')
+    tag_listing_rows(rows)
+
+    response = listing_collection_response(listing_to_dict(row) for row in rows)
+    if has_more:
+        last = rows[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last['created_at'], last['id'])
+    return response
+
+@app.route('/listings/search', methods=['GET'])
+@response_cache.cached(variant=listing_format)
+def search_listings():
+    """BM25-ranked full-text search (substring matching off SQLite).
+
+    The cursor is the offset of the next page.
+    """
+    args = request.args
+    match_query = search.build_match_query(args.get('q'))
+    if match_query is None:
+        return jsonify({"error": "Search query 'q' is required"}), 400
+    try:
+        limit = parse_limit(args.get('limit'))
+        offset = int(args.get('cursor') or 0)
+        if offset < 0:
+            raise ValueError("cursor must not be negative")
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+
+    if db.engine.dialect.name == 'sqlite':
+        stmt = (listing_select()
+                .join(search.listing_fts, search.listing_fts.c.rowid == Listing.id)
+                .where(search.match_clause(match_query))
+                .order_by(search.bm25_rank(), Listing.id.desc()))
+    else:
+        # listing_fts is FTS5, which only SQLite has: match substrings, newest first.
+        columns = (Listing.title, Listing.description, Listing.category, Listing.location)
+        stmt = (listing_select()
+                .where(search.like_clause(search.search_terms(args.get('q')), columns))
+                .order_by(Listing.created_at.desc(), Listing.id.desc()))
+    if args.get('category'):
+        stmt = stmt.where(Listing.category == args['category'])
+    stmt = stmt.offset(offset).limit(limit + 1)
+    rows = db.session.execute(stmt).mappings().all()
+    add_cache_tags('listings')
+    tag_listing_rows(rows[:limit])
+
+    response = listing_collection_response(listing_to_dict(row) for row in rows[:limit])
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = str(offset + limit)
+    return response
+
+@app.route('/listings/nearby', methods=['GET'])
+def nearby_listings():
+    """Listings within radius_km of (lat, lng), nearest first."""
+    args = request.args
+    try:
+        lat, lng = float(args['lat']), float(args['lng'])
+        radius_km = float(args.get('radius_km', 5))
+        limit = parse_limit(args.get('limit'))
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError("coordinates out of range")
+        if not 0 < radius_km <= app.config['NEARBY_MAX_RADIUS_KM']:
+            raise ValueError("radius out of range")
+    except (KeyError, ValueError):
+        return jsonify({"error": "lat, lng and an in-range radius_km are required"}), 400
+
+    matches = find_nearby(db.session, lat, lng, radius_km, limit)
+
+    def items():
+        for distance, row in matches:
+            item = listing_to_dict(row)
+            item['distance_km'] = round(distance, 3)
+            yield item
+    return listing_collection_response(items())
 
 @app.route('/listings/<int:id>', methods=['GET'])
+@response_cache.cached
 def get_listing(id):
-    item = Listing.query.get_or_404(id)
-    return jsonify({
-        "id": item.id, "title": item.title, "description": item.description,
-        "price": item.price, "category": item.category, "location": item.location,
-        "image_url": item.image_url, "user_id": item.user_id,
-        "phone_number": item.author.phone_number
-    })
+    row = db.session.execute(listing_select().where(Listing.id == id)).mappings().first()
+    if row is None:
+        abort(404)
+    add_cache_tags(f"listing:{id}")
+    tag_listing_rows([row])
+    return jsonify(listing_to_dict(row, variant='detail'))
 
 @app.route('/listings', methods=['POST'])
 @jwt_required()
@@ -176,13 +579,33 @@ def create_listing():
     
     # Handle Dual-Mode Image
     image_url = request.form.get('image_url')
+    image_hash, image_status, image_relpath = None, images.STATUS_NONE, None
     if 'file' in request.files:
         file = request.files['file']
         if file.filename != '':
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            image_url = f"http://localhost:5000/static/uploads/{filename}"
+            try:
+                image_hash, image_relpath, _ = images.store_upload(
+                    file.stream, secure_filename(file.filename), app.config['UPLOAD_FOLDER'])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            image_url = f"{app.config['UPLOAD_URL']}/{image_relpath}"
+            # Identical content uploaded before may already have its variants.
+            if images.variants_exist(app.config['UPLOAD_FOLDER'], image_hash):
+                image_status = images.STATUS_READY
+            else:
+                image_status = images.STATUS_PENDING
+
+    latitude, longitude = request.form.get('lat'), request.form.get('lng')
+    if latitude and longitude:
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except ValueError:
+            return jsonify({"error": "Invalid coordinates"}), 400
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return jsonify({"error": "Invalid coordinates"}), 400
+        geohash = geo.encode(latitude, longitude)
+    else:
+        latitude = longitude = geohash = None
 
     new_listing = Listing(
         title=request.form.get('title'),
@@ -191,11 +614,94 @@ def create_listing():
         category=request.form.get('category'),
         location=request.form.get('location'),
         image_url=image_url,
+        image_hash=image_hash,
+        image_status=image_status,
+        latitude=latitude,
+        longitude=longitude,
+        geohash=geohash,
         user_id=user_id
     )
     db.session.add(new_listing)
     db.session.commit()
-    return jsonify({"message": "Listing published"}), 201
+    response_cache.invalidate('listings')
+    if image_status == images.STATUS_PENDING:
+        image_pipeline.submit(image_hash, image_relpath, on_image_processed)
+    return jsonify({
+        "message": "Listing published",
+        "id": new_listing.id,
+        "image_status": image_status
+    }), 201
+
+def insert_listings(values_list, user_id):
+    """Insert one batch of validated listing values in a single transaction."""
+    for values in values_list:
+        values['user_id'] = user_id
+    try:
+        db.session.execute(db.insert(Listing), values_list)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    response_cache.invalidate('listings')
+
+@app.route('/listings/import', methods=['POST'])
+@jwt_required()
+def import_listings():
+    """Bulk-create listings from a streamed NDJSON or CSV body."""
+    fmt = bulk.detect_format(request.content_type, request.args.get('format'))
+    if fmt is None:
+        return jsonify({"error": "Send text/csv or application/x-ndjson"}), 415
+    user_id = int(get_jwt_identity())
+    report = bulk.import_rows(
+        bulk.parse_rows(request.stream, fmt),
+        lambda values_list: insert_listings(values_list, user_id),
+        batch_size=app.config['BULK_BATCH_SIZE'],
+    )
+    return jsonify(report), 200 if report['imported'] or not report['failed'] else 400
+
+@app.route('/listings/export', methods=['GET'])
+def export_listings():
+    """Stream every listing (optionally one user's) as NDJSON or CSV."""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in bulk.FORMATS:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    try:
+        owner = int(request.args['user_id']) if request.args.get('user_id') else None
+    except ValueError:
+        return jsonify({"error": "Invalid user_id"}), 400
+    columns = [getattr(Listing, field) for field in bulk.EXPORT_FIELDS]
+    batch_size = app.config['BULK_BATCH_SIZE']
+
+    def batches():
+        # Keyset on id: each batch is an index seek, however deep.
+        last_id = 0
+        while True:
+            stmt = db.select(*columns).where(Listing.id > last_id)
+            if owner is not None:
+                stmt = stmt.where(Listing.user_id == owner)
+            rows = db.session.execute(stmt.order_by(Listing.id).limit(batch_size)).mappings().all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1]['id']
+
+    body = bulk.export_csv(batches()) if fmt == 'csv' else bulk.export_ndjson(batches())
+    return Response(stream_with_context(body), mimetype=bulk.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=listings.{fmt}'})
+
+def on_image_processed(digest, ok):
+    """Pipeline callback: flip every listing using this image to its final status."""
+    # A failed job may have lost a race with one that wrote the same variants.
+    ok = ok or images.variants_exist(app.config['UPLOAD_FOLDER'], digest)
+    status = images.STATUS_READY if ok else images.STATUS_FAILED
+    if not ok:
+        print(f"Image processing failed for {digest}")
+    with app.app_context():
+        db.session.execute(db.update(Listing)
+                           .where(Listing.image_hash == digest)
+                           .values(image_status=status))
+        db.session.commit()
+    response_cache.invalidate(f"image:{digest}")
 
 @app.route('/listings/<int:id>', methods=['DELETE'])
 @jwt_required()
@@ -205,10 +711,265 @@ def delete_listing(id):
         return jsonify({"error": "Unauthorized"}), 403
     db.session.delete(item)
     db.session.commit()
+    response_cache.invalidate('listings', f"listing:{id}")
     return jsonify({"message": "Deleted successfully"})
 
+# --- CHAT ---
+
+def chat_message_to_dict(message):
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "sender_id": message.sender_id,
+        "body": message.body,
+        "created_at": message.created_at.isoformat(),
+    }
+
+def require_membership(conversation_id, user_id):
+    if db.session.get(ConversationMember, (conversation_id, user_id)) is None:
+        abort(404)
+
+def contact_ids(user_id, limit=200):
+    """Users sharing one of this user's most recent conversations."""
+    mine = aliased(ConversationMember)
+    other = aliased(ConversationMember)
+    return set(db.session.execute(
+        db.select(other.user_id)
+        .join(mine, mine.conversation_id == other.conversation_id)
+        .where(mine.user_id == user_id, other.user_id != user_id)
+        .order_by(mine.last_message_at.desc())
+        .limit(limit)
+    ).scalars())
+
+@app.route('/conversations', methods=['POST'])
+@jwt_required()
+def start_conversation():
+    """Open (or reuse) the buyer's conversation with a listing's seller."""
+    user_id = int(get_jwt_identity())
+    listing = db.get_or_404(Listing, request.json.get('listing_id'))
+    if listing.user_id == user_id:
+        return jsonify({"error": "You cannot message yourself"}), 400
+
+    existing = Conversation.query.filter_by(listing_id=listing.id, buyer_id=user_id).first()
+    if existing:
+        return jsonify({"id": existing.id}), 200
+
+    conversation = Conversation(listing_id=listing.id, buyer_id=user_id, seller_id=listing.user_id)
+    db.session.add(conversation)
+    try:
+        db.session.flush()
+        db.session.add_all([
+            ConversationMember(conversation_id=conversation.id, user_id=user_id),
+            ConversationMember(conversation_id=conversation.id, user_id=listing.user_id),
+        ])
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request created it first.
+        db.session.rollback()
+        existing = Conversation.query.filter_by(listing_id=listing.id, buyer_id=user_id).first()
+        return jsonify({"id": existing.id}), 200
+    return jsonify({"id": conversation.id}), 201
+
+@app.route('/conversations', methods=['GET'])
+@jwt_required()
+def list_conversations():
+    """The user's conversations, most recently active first."""
+    user_id = int(get_jwt_identity())
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+
+    mine = aliased(ConversationMember)
+    other = aliased(ConversationMember)
+    stmt = (db.select(mine.conversation_id, mine.last_message_at,
+                      Conversation.last_message_preview, Conversation.listing_id,
+                      Listing.title.label('listing_title'),
+                      other.user_id.label('other_user_id'), User.username.label('other_username'))
+            .join(Conversation, Conversation.id == mine.conversation_id)
+            .join(other, (other.conversation_id == mine.conversation_id) & (other.user_id != mine.user_id))
+            .join(User, User.id == other.user_id)
+            .outerjoin(Listing, Listing.id == Conversation.listing_id)
+            .where(mine.user_id == user_id))
+    if cursor is not None:
+        stmt = stmt.where(tuple_(mine.last_message_at, mine.conversation_id) < cursor)
+    stmt = stmt.order_by(mine.last_message_at.desc(), mine.conversation_id.desc()).limit(limit + 1)
+    rows = db.session.execute(stmt).mappings().all()
+
+    response = jsonify([{
+        "id": row['conversation_id'],
+        "listing_id": row['listing_id'],
+        "listing_title": row['listing_title'],
+        "other_user": {
+            "id": row['other_user_id'],
+            "username": row['other_username'],
+            "online": chat_hub.is_online(row['other_user_id']),
+        },
+        "last_message": row['last_message_preview'],
+        "last_message_at": row['last_message_at'].isoformat(),
+    } for row in rows[:limit]])
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last['last_message_at'], last['conversation_id'])
+    return response
+
+@app.route('/conversations/<int:id>/messages', methods=['GET'])
+@jwt_required()
+def get_messages(id):
+    """Message history newest first; pass ?before=<message id> for older pages."""
+    require_membership(id, int(get_jwt_identity()))
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        before = int(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+
+    query = ChatMessage.query.filter(ChatMessage.conversation_id == id)
+    if before is not None:
+        query = query.filter(ChatMessage.id < before)
+    messages = query.order_by(ChatMessage.id.desc()).limit(limit).all()
+    return jsonify([chat_message_to_dict(message) for message in messages])
+
+@app.route('/conversations/<int:id>/messages', methods=['POST'])
+@jwt_required()
+def send_message(id):
+    user_id = int(get_jwt_identity())
+    require_membership(id, user_id)
+    body = (request.json.get('body') or '').strip()
+    if not body or len(body) > app.config['CHAT_MAX_MESSAGE_LENGTH']:
+        return jsonify({"error": "Message body is empty or too long"}), 400
+
+    message = ChatMessage(conversation_id=id, sender_id=user_id, body=body)
+    db.session.add(message)
+    db.session.flush()
+    db.session.execute(db.update(Conversation).where(Conversation.id == id)
+                       .values(last_message_preview=body[:140]))
+    db.session.execute(db.update(ConversationMember).where(ConversationMember.conversation_id == id)
+                       .values(last_message_at=message.created_at))
+    member_ids = db.session.execute(
+        db.select(ConversationMember.user_id).where(ConversationMember.conversation_id == id)
+    ).scalars().all()
+    db.session.commit()
+
+    payload = chat_message_to_dict(message)
+    chat_hub.publish(member_ids, 'message', payload)
+    return jsonify(payload), 201
+
+@app.route('/presence', methods=['GET'])
+@jwt_required()
+def presence():
+    try:
+        user_ids = [int(v) for v in request.args.get('user_ids', '').split(',') if v]
+    except ValueError:
+        return jsonify({"error": "user_ids must be a comma-separated list of ids"}), 400
+    return jsonify({str(user_id): chat_hub.is_online(user_id) for user_id in user_ids[:200]})
+
+@app.route('/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string']) # EventSource cannot set headers
+def event_stream():
+    """Server-Sent Events: 'message' for new chat messages, 'presence' for contacts."""
+    user_id = int(get_jwt_identity())
+    contacts = contact_ids(user_id)
+    # Release the DB connection now; the stream may stay open for hours.
+    db.session.remove()
+
+    subscription, first = chat_hub.subscribe(user_id)
+    if first:
+        chat_hub.publish(contacts, 'presence', {"user_id": user_id, "online": True})
+
+    def on_close(last):
+        if last:
+            chat_hub.publish(contacts, 'presence', {"user_id": user_id, "online": False})
+
+    return Response(chat_hub.stream(subscription, on_close), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- STATS ---
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/outbox/stats', methods=['GET'])
+def outbox_stats():
+    return jsonify(outbox_sender.stats())
+
+@metrics.register
+def collect_subsystem_metrics():
+    cache = response_cache.stats()
+    for key in ('hits', 'misses', 'evictions', 'invalidations'):
+        yield f'talalink_response_cache_{key}_total', 'counter', f'Response cache {key}.', cache[key]
+    yield 'talalink_response_cache_bytes', 'gauge', 'Bytes held by the response cache.', cache['bytes']
+    yield ('talalink_password_hash_rejected_total', 'counter',
+           'Hashing requests rejected because the pool was saturated.', password_hasher.rejected)
+    yield 'talalink_chat_connections', 'gauge', 'Open /stream connections.', chat_hub.connection_count()
+    yield 'talalink_chat_dropped_total', 'counter', 'Chat events dropped for slow consumers.', chat_hub.dropped
+    yield 'talalink_identity_cache_hits_total', 'counter', 'JWT user lookups served from cache.', identity_cache.hits
+    yield 'talalink_identity_cache_misses_total', 'counter', 'JWT user lookups that queried the database.', identity_cache.misses
+    revocations = revocation_list.stats()
+    yield ('talalink_revocation_db_lookups_total', 'counter',
+           'Revocation checks the Bloom filter could not rule out.', revocations['db_lookups'])
+    yield ('talalink_revocation_false_positives_total', 'counter',
+           'Bloom filter hits for tokens that were not revoked.', revocations['false_positives'])
+    yield ('talalink_revocation_sync_errors_total', 'counter',
+           'Failed refreshes of the revocation filter.', revocations['sync_errors'])
+
+@metrics.register
+def collect_outbox_metrics():
+    backlog = outbox_sender.stats()
+    yield 'talalink_outbox_pending', 'gauge', 'Emails waiting in the outbox.', backlog['pending']
+    yield 'talalink_outbox_dead', 'gauge', 'Emails that exhausted their retries.', backlog['dead']
+    yield ('talalink_outbox_oldest_pending_age_seconds', 'gauge', 'Age of the oldest pending email.',
+           backlog['oldest_pending_age_seconds'])
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# --- CLI ---
+
+@app.cli.command('drain-outbox')
+def drain_outbox_command():
+    """Send every due outbox email now, without the background sender."""
+    total = 0
+    while (sent := outbox_sender.drain_once()):
+        total += sent
+    print(f"Sent {total} email(s); backlog: {outbox_sender.stats()}")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Create the listing full-text index and fill it from existing rows."""
+    with db.engine.begin() as connection:
+        search.rebuild_search_index(connection)
+    print("Listing search index rebuilt.")
+
+@app.cli.command('process-images')
+def process_images_command():
+    """Generate variants for uploads left pending or failed, e.g. by a restart.
+
+    This runs outside the server, so its cache invalidations only reach this
+    process; a running server shows the new statuses once its cached listing
+    responses expire (RESPONSE_CACHE_TTL), or straight away after a restart.
+    """
+    rows = db.session.execute(
+        db.select(Listing.image_hash, Listing.image_url)
+        .where(Listing.image_status.in_([images.STATUS_PENDING, images.STATUS_FAILED]))
+        .distinct()
+    ).all()
+    for digest, image_url in rows:
+        relpath = images.original_relpath(digest, image_url.rsplit('.', 1)[-1])
+        try:
+            images.generate_variants(os.path.join(app.config['UPLOAD_FOLDER'], relpath),
+                                     app.config['UPLOAD_FOLDER'], digest)
+            on_image_processed(digest, True)
+        except Exception as e:
+            print(f"{digest}: {e}")
+            on_image_processed(digest, False)
+    print(f"Processed {len(rows)} image(s).")
+
 # --- MAIN ---
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all() 
+        upgrade()
     app.run(port=5000, debug=True)
\ No newline at end of file
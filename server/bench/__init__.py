@@ -0,0 +1 @@
+"""Benchmarks for the TalaLink API. Run modules with ``python -m bench.<name>`` from server/."""
@@ -0,0 +1,99 @@
+"""Hold thousands of idle /stream connections and time one fan-out.
+
+Signs up a seller and a buyer, opens a conversation, opens N SSE
+connections as the seller, then has the buyer send one message and
+measures how long each connection takes to receive it. Needs a running
+server that can hold N open connections (see chat.py).
+
+    python -m bench.chat_idle --url http://127.0.0.1:5000 --connections 2000
+"""
+import argparse
+import asyncio
+import json
+import secrets
+import statistics
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+def api(url, path, payload=None, token=None, form=False):
+    headers = {}
+    data = None
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    if payload is not None:
+        if form:
+            data = '&'.join(f'{k}={v}' for k, v in payload.items()).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        else:
+            data = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(url + path, data=data, headers=headers)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def make_user(url, name):
+    email = f'{name}-{secrets.token_hex(4)}@bench.invalid'
+    api(url, '/signup', {"username": email, "email": email, "password": "bench-password"})
+    return api(url, '/login', {"email": email, "password": "bench-password"})['token']
+
+async def open_stream(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n'.encode())
+    await writer.drain()
+    status = await reader.readline()
+    if b' 200 ' not in status:
+        raise RuntimeError(status.decode().strip())
+    await reader.readuntil(b'\r\n\r\n')
+    return reader, writer
+
+async def wait_for_message(reader, marker):
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError('stream closed')
+        if marker in line:
+            return time.perf_counter()
+
+async def main_async(args):
+    seller = make_user(args.url, 'seller')
+    buyer = make_user(args.url, 'buyer')
+    api(args.url, '/listings', {"title": "Bench", "description": "-", "price": "1",
+                                "category": "Product", "location": "Thika Town"}, seller, form=True)
+    listing_id = api(args.url, '/listings?limit=1')[0]['id']
+    conversation = api(args.url, '/conversations', {"listing_id": listing_id}, buyer)['id']
+
+    parts = urlsplit(args.url)
+    path = f'/stream?jwt={seller}'
+    streams = []
+    start = time.perf_counter()
+    for offset in range(0, args.connections, args.open_batch):
+        batch = range(min(args.open_batch, args.connections - offset))
+        streams += await asyncio.gather(*(open_stream(parts.hostname, parts.port, path) for _ in batch))
+    print(f"opened {len(streams)} streams in {time.perf_counter() - start:.1f}s")
+
+    await asyncio.sleep(args.idle)
+    marker = secrets.token_hex(8).encode()
+    waiters = [asyncio.create_task(wait_for_message(reader, marker)) for reader, _ in streams]
+    sent_at = time.perf_counter()
+    await asyncio.to_thread(api, args.url, f'/conversations/{conversation}/messages',
+                            {"body": marker.decode()}, buyer)
+    arrivals = await asyncio.gather(*waiters)
+    latencies = sorted((t - sent_at) * 1000 for t in arrivals)
+    print(f"fan-out to {len(latencies)} connections: "
+          f"p50 {statistics.median(latencies):.1f}ms "
+          f"p99 {latencies[int(0.99 * (len(latencies) - 1))]:.1f}ms "
+          f"max {latencies[-1]:.1f}ms")
+    for _, writer in streams:
+        writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--open-batch', type=int, default=200)
+    parser.add_argument('--idle', type=float, default=5.0, help="seconds to idle before sending")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
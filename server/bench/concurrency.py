@@ -0,0 +1,125 @@
+"""Mixed read/write load on /listings: do readers stall behind writers?
+
+Runs the reader load alone, then again while writer threads POST listings
+as fast as they can, and compares the two. In WAL mode readers never wait
+for the writer, so read latency under writes should stay close to the
+read-only run, and no request should fail with "database is locked". Set
+SQLITE_JOURNAL_MODE=DELETE on the server to see the old behaviour.
+
+Use the server setup from bench/run.py (a database seeded with
+``seed.py synthetic``; the run adds listings to it):
+
+    python -m bench.concurrency --readers 8 --writers 4 --duration 10 --check
+"""
+import argparse
+import http.client
+import itertools
+import json
+import statistics
+import sys
+import threading
+import time
+
+from bench.run import BENCH_PASSWORD, Client, bench_email
+
+def run_workers(worker, count, duration):
+    """Run count worker threads for duration seconds; returns their results."""
+    results = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop():
+        local = []
+        while time.perf_counter() < deadline:
+            local.append(worker())
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=loop) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def summarize(results, duration):
+    """results are (status, seconds) pairs."""
+    latencies = sorted(elapsed * 1000 for status, elapsed in results if 200 <= status < 400)
+    errors = sum(1 for status, _ in results if not 200 <= status < 400)
+    if not latencies:
+        return {"errors": errors}
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))], 2),
+        "rps": round(len(latencies) / duration, 1),
+        "errors": errors,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per phase")
+    parser.add_argument('--check', action='store_true',
+                        help="exit 1 on errors or if mixed read p95 exceeds --max-slowdown x read-only p95")
+    parser.add_argument('--max-slowdown', type=float, default=2.0)
+    args = parser.parse_args()
+
+    client = Client(args.url)
+    status, _, _, data = client.request('POST', '/login', {"email": bench_email(0), "password": BENCH_PASSWORD})
+    if status != 200:
+        sys.exit(f"Login for {bench_email(0)} failed with {status}; seed with seed.py synthetic.")
+    auth = {"Authorization": f"Bearer {json.loads(data)['token']}"}
+    counter = itertools.count()
+
+    def call(method, path, body=None, headers=None, form=False):
+        try:
+            status, _, elapsed, _ = client.request(method, path, body, headers, form=form)
+        except (OSError, http.client.HTTPException):
+            return 0, 0.0
+        return status, elapsed
+
+    def read():
+        # A unique parameter keeps every read out of the response cache.
+        return call('GET', f'/listings?limit=20&_={next(counter)}')
+
+    def write():
+        n = next(counter)
+        return call('POST', '/listings', {
+            "title": f"Concurrency bench {n}", "description": "Written by bench.concurrency",
+            "price": "100", "category": "Product", "location": "Thika Town",
+        }, auth, form=True)
+
+    solo = summarize(run_workers(read, args.readers, args.duration), args.duration)
+
+    mixed_results = {}
+    def writers():
+        mixed_results['writes'] = run_workers(write, args.writers, args.duration)
+    writer_thread = threading.Thread(target=writers)
+    writer_thread.start()
+    mixed = summarize(run_workers(read, args.readers, args.duration), args.duration)
+    writer_thread.join()
+    writes = summarize(mixed_results['writes'], args.duration)
+
+    print(f"{'phase':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>6}")
+    for name, result in (('reads alone', solo), ('reads + writes', mixed), ('writes', writes)):
+        print(f"{name:<14} {result.get('p50_ms', '-'):>8} {result.get('p95_ms', '-'):>8} "
+              f"{result.get('p99_ms', '-'):>8} {result.get('rps', '-'):>8} {result['errors']:>6}")
+
+    problems = [f"{name}: {result['errors']} failed requests"
+                for name, result in (('reads', solo), ('mixed reads', mixed), ('writes', writes))
+                if result['errors']]
+    if 'p95_ms' in solo and 'p95_ms' in mixed:
+        slowdown = mixed['p95_ms'] / solo['p95_ms']
+        print(f"read p95 slowdown under writes: {slowdown:.2f}x")
+        if slowdown > args.max_slowdown:
+            problems.append(f"read p95 slowed {slowdown:.2f}x under writes (max {args.max_slowdown}x)")
+    if args.check:
+        for problem in problems:
+            print(f"FAIL {problem}")
+        sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
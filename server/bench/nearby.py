@@ -0,0 +1,94 @@
+"""Latency of /listings/nearby lookups as the listing table grows.
+
+Builds throwaway SQLite databases of increasing size and times
+``find_nearby`` for random centres, against a full scan for comparison.
+``--spread clustered`` (the default) places listings and centres the way
+``seed.py synthetic`` does, densely around Thika, which is the hard case:
+a radius there holds a large share of the table. ``--spread uniform``
+scatters both over Kenya.
+
+    python -m bench.nearby --sizes 10000 100000 1000000 --radius-km 5
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+import geo
+import seed
+from app import db, find_nearby, Listing, User
+
+# Rough bounding box of Kenya.
+LAT_RANGE = (-4.7, 4.6)
+LNG_RANGE = (33.9, 41.9)
+BATCH = 50_000
+
+def random_point(spread, rng):
+    if spread == 'clustered':
+        row = seed.synthetic_listing(rng, 1, 1, datetime.utcnow())
+        return row['latitude'], row['longitude']
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+
+def populate(engine, count, spread, rng):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [{"id": 1, "username": "bench", "email": "bench@example.com", "password": "-"}])
+        for start in range(0, count, BATCH):
+            rows = []
+            for _ in range(min(BATCH, count - start)):
+                lat, lng = random_point(spread, rng)
+                rows.append({
+                    "title": "Bench item", "description": "-", "price": 100.0,
+                    "category": "Product", "location": "Thika Town", "user_id": 1,
+                    "latitude": lat, "longitude": lng, "geohash": geo.encode(lat, lng),
+                })
+            conn.execute(insert(Listing.__table__), rows)
+
+def time_queries(engine, queries, radius_km, spread, rng):
+    samples = []
+    with Session(engine) as session:
+        for _ in range(queries):
+            lat, lng = random_point(spread, rng)
+            start = time.perf_counter()
+            find_nearby(session, lat, lng, radius_km, limit=20)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def time_full_scan(engine, radius_km, spread, rng):
+    lat, lng = random_point(spread, rng)
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT latitude, longitude FROM listing")
+        sorted(d for d in (geo.haversine_km(lat, lng, a, b) for a, b in rows) if d <= radius_km)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--radius-km', type=float, default=5.0, help="the route's default")
+    parser.add_argument('--spread', choices=('clustered', 'uniform'), default='clustered')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-scan', action='store_true', help="skip the full-scan comparison")
+    args = parser.parse_args()
+
+    print(f"{'listings':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'scan ms':>9}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            populate(engine, size, args.spread, rng)
+            samples = sorted(time_queries(engine, args.queries, args.radius_km, args.spread, rng))
+            scan = '-' if args.no_scan else f"{time_full_scan(engine, args.radius_km, args.spread, rng):.1f}"
+            pct = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))]
+            print(f"{size:>10} {statistics.median(samples):>8.3f} {pct(0.95):>8.3f} {pct(0.99):>8.3f} {scan:>9}")
+            engine.dispose()
+
+if __name__ == '__main__':
+    main()
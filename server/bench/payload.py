@@ -0,0 +1,102 @@
+"""Time to first byte, total time, size and peak memory of the listing routes.
+
+Every request goes through the app's test client against the database in
+DATABASE_URL, so each row of the report is a real endpoint:
+
+* ``listings``: GET /listings?limit=100 as a cache miss (a unique ``_``
+  parameter). The response cache buffers it, so it arrives in one piece.
+* ``nearby``: GET /listings/nearby, 100 listings around Thika, streamed.
+* ``export``: GET /listings/export, every listing streamed as NDJSON.
+
+``+gzip`` variants send Accept-Encoding: gzip, and ``--ndjson`` asks
+listings and nearby for NDJSON. Timings are medians over ``--repeat``
+requests, and ``chunks`` is how many pieces the body arrived in: 1 for a
+buffered response. Each variant runs in a fresh subprocess so that its
+peak RSS is its own; the peak is reported above the RSS once the app is
+imported.
+Seed the database as for bench/run.py:
+
+    DATABASE_URL=sqlite:////tmp/bench.db OUTBOX_SENDER=0 python -m bench.payload
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROUTES = {
+    'listings': '/listings?limit=100&_={n}',
+    'nearby': '/listings/nearby?lat=-1.0333&lng=37.0693&radius_km=5&limit=100&_={n}',
+    'export': '/listings/export?format=ndjson&_={n}',
+}
+VARIANTS = tuple(f"{route}{suffix}" for route in ROUTES for suffix in ('', '+gzip'))
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+
+def timed_get(client, path, headers):
+    """(ttfb seconds, total seconds, body bytes, chunks, response) for one request."""
+    start = time.perf_counter()
+    response = client.get(path, headers=headers, buffered=False)
+    try:
+        chunks = iter(response.response)
+        first = next(chunks, b'')
+        ttfb = time.perf_counter() - start
+        size, count = len(first), 1
+        for chunk in chunks:
+            size += len(chunk)
+            count += 1
+        total = time.perf_counter() - start
+    finally:
+        response.close()
+    if response.status_code != 200:
+        sys.exit(f"GET {path} returned {response.status_code}")
+    return ttfb, total, size, count, response
+
+def run_variant(variant, repeat, ndjson):
+    import app as server
+
+    baseline = peak_rss_mb()
+    route, _, content_encoding = variant.partition('+')
+    headers = {'Accept': 'application/x-ndjson' if ndjson else 'application/json',
+               'Accept-Encoding': content_encoding or 'identity'}
+    client = server.app.test_client()
+    results = [timed_get(client, ROUTES[route].format(n=n), headers) for n in range(repeat)]
+    _, _, size, chunks, response = results[-1]
+    return {
+        "ttfb_ms": round(statistics.median(r[0] for r in results) * 1000, 2),
+        "total_ms": round(statistics.median(r[1] for r in results) * 1000, 1),
+        "bytes": size,
+        "chunks": chunks,
+        "content_encoding": response.headers.get('Content-Encoding', '-'),
+        "peak_rss_mb": round(peak_rss_mb() - baseline, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument('--repeat', type=int, default=20, help="requests per variant")
+    parser.add_argument('--ndjson', action='store_true', help="Accept NDJSON from listings and nearby")
+    parser.add_argument('--worker', choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_variant(args.worker, args.repeat, args.ndjson)))
+        return
+
+    print(f"{'variant':<14} {'ttfb ms':>9} {'total ms':>9} {'bytes':>11} {'encoding':>8} "
+          f"{'chunks':>7} {'+RSS MB':>8}")
+    for variant in args.variants:
+        command = [sys.executable, '-m', 'bench.payload', '--worker', variant, '--repeat', str(args.repeat)]
+        if args.ndjson:
+            command.append('--ndjson')
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{variant:<14} {result['ttfb_ms']:>9} {result['total_ms']:>9} {result['bytes']:>11} "
+              f"{result['content_encoding']:>8} {result['chunks']:>7} "
+              f"{result['peak_rss_mb']:>8}")
+
+if __name__ == '__main__':
+    main()
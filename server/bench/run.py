@@ -0,0 +1,230 @@
+"""Load-test the API with concurrent clients and compare against baselines.
+
+Start a server on a database seeded with ``seed.py synthetic``. Start it
+with query counting on and the login throttles raised, so the run measures
+hashing and not 429s:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python seed.py synthetic --users 1000 --listings 1000000
+    DATABASE_URL=sqlite:////tmp/bench.db QUERY_COUNT_HEADER=1 HASH_IP_LIMIT=100000 \\
+        LOGIN_ACCOUNT_LIMIT=100000 flask --app app run --no-reload --with-threads
+    python -m bench.run --users 1000 --check
+
+GET requests carry a unique ``_`` parameter so they miss the response
+cache and measure the route itself; pass ``--allow-cache`` to include it.
+
+Each scenario reports p50/p95/p99 latency, throughput and mean SQL
+statements per request (from the X-Query-Count header). With ``--check``
+the exit status is 1 if any scenario regresses past bench/baselines.json
+by more than ``--tolerance``. Query counts must match exactly; a drop
+means the baseline is stale and should be regenerated. Baselines
+are machine-specific: regenerate them with ``--update-baselines`` on the
+host that runs the check.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'baselines.json')
+BENCH_PASSWORD = 'bench-password'  # see seed.py
+CATEGORIES = ('Product', 'Service')
+SEARCH_TERMS = ('pump', 'carp', 'solar', 'repair', 'inverter', 'weld', 'sofa', 'tailor')
+
+class Client:
+    """One keep-alive connection per worker thread."""
+    _local = threading.local()
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+
+    def request(self, method, path, body=None, headers=None, form=False):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = dict(headers or {})
+        if body is not None and form:
+            body = urlencode(body)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (ConnectionError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        elapsed = time.perf_counter() - start
+        return response.status, response.getheader('X-Query-Count'), elapsed, data
+
+def bench_email(n):
+    return f"bench-user-{n}@example.com"
+
+def make_scenarios(client, args, rng):
+    status, _, _, data = client.request('GET', '/listings?limit=1')
+    if status != 200 or not json.loads(data):
+        sys.exit("GET /listings returned no listings; seed the database first.")
+    max_id = json.loads(data)[0]['id']
+
+    tokens = []
+    for n in range(min(args.concurrency, args.users)):
+        status, _, _, data = client.request('POST', '/login', {"email": bench_email(n), "password": BENCH_PASSWORD})
+        if status != 200:
+            sys.exit(f"Login for {bench_email(n)} failed with {status}; seed with seed.py synthetic.")
+        tokens.append(json.loads(data)['token'])
+        # Prime the identity cache so the profile scenario measures the
+        # steady state, not each token's first lookup.
+        client.request('GET', '/profile', None, {"Authorization": f"Bearer {tokens[-1]}"})
+
+    def listings():
+        params = {"limit": 20}
+        if rng.random() < 0.5:
+            params["category"] = rng.choice(CATEGORIES)
+        return 'GET', '/listings?' + urlencode(params), None, None
+
+    def listing_detail():
+        return 'GET', f'/listings/{rng.randint(1, max_id)}', None, None
+
+    def search():
+        return 'GET', '/listings/search?' + urlencode({"q": rng.choice(SEARCH_TERMS)}), None, None
+
+    def profile():
+        return 'GET', '/profile', None, {"Authorization": f"Bearer {rng.choice(tokens)}"}
+
+    def login():
+        return 'POST', '/login', {"email": bench_email(rng.randrange(args.users)), "password": BENCH_PASSWORD}, None
+
+    return {
+        'listings': (listings, args.requests),
+        'listing_detail': (listing_detail, args.requests),
+        'search': (search, args.requests),
+        'profile': (profile, args.requests),
+        # bcrypt makes each login ~100x the cost of a read.
+        'login': (login, max(1, args.requests // 20)),
+    }
+
+def cache_bust(request, n):
+    method, path, body, headers = request
+    if method != 'GET':
+        return request
+    return method, f"{path}{'&' if '?' in path else '?'}_={n}", body, headers
+
+def run_scenario(client, make_request, count, concurrency, allow_cache=False):
+    requests = [make_request() for _ in range(count)]
+    if not allow_cache:
+        requests = [cache_bust(request, n) for n, request in enumerate(requests)]
+    results = []
+
+    def send(request):
+        method, path, body, headers = request
+        try:
+            return client.request(method, path, body, headers)
+        except (OSError, http.client.HTTPException):
+            return 0, None, 0.0, b''
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, requests))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(elapsed * 1000 for status, _, elapsed, _ in results if 200 <= status < 400)
+    errors = sum(1 for status, *_ in results if not 200 <= status < 400)
+    counts = [int(q) for status, q, _, _ in results if q is not None]
+    if not latencies:
+        return {"errors": errors}
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "rps": round(len(latencies) / wall, 1),
+        "queries_per_request": round(statistics.mean(counts), 2) if counts else None,
+        "errors": errors,
+    }
+
+def compare(results, baselines, tolerance):
+    """Human-readable regressions of results against baselines."""
+    problems = []
+    for name, result in results.items():
+        base = baselines.get(name)
+        if not base:
+            continue
+        if result.get("errors"):
+            problems.append(f"{name}: {result['errors']} failed requests")
+        if "p95_ms" not in result:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {result['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{name}: {result['rps']} req/s < baseline {base['rps']} req/s")
+        queries, base_queries = result.get("queries_per_request"), base.get("queries_per_request")
+        if queries is not None and base_queries is not None and queries != base_queries:
+            problems.append(f"{name}: {queries} queries/request != baseline {base_queries}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=1000, help="--users given to seed.py synthetic")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000, help="requests per read scenario")
+    parser.add_argument('--scenarios', nargs='+', help="subset of scenarios to run")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--allow-cache', action='store_true', help="let GETs hit the response cache")
+    parser.add_argument('--check', action='store_true', help="exit 1 on regression against baselines")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--update-baselines', action='store_true')
+    parser.add_argument('--json', help="also write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    client = Client(args.url)
+    scenarios = make_scenarios(client, args, rng)
+    selected = args.scenarios or list(scenarios)
+
+    results = {}
+    print(f"{'scenario':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'q/req':>6} {'errors':>6}")
+    for name in selected:
+        make_request, count = scenarios[name]
+        result = results[name] = run_scenario(client, make_request, count, args.concurrency, args.allow_cache)
+        print(f"{name:<16} {result.get('p50_ms', '-'):>8} {result.get('p95_ms', '-'):>8} "
+              f"{result.get('p99_ms', '-'):>8} {result.get('rps', '-'):>8} "
+              f"{result.get('queries_per_request') if result.get('queries_per_request') is not None else '-':>6} "
+              f"{result['errors']:>6}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    if args.update_baselines:
+        baselines.update({name: result for name, result in results.items() if "p95_ms" in result})
+        with open(BASELINES, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baselines written to {BASELINES}")
+    if args.check:
+        problems = compare(results, baselines, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Streaming bulk import and export of listings as NDJSON or CSV.
+
+Imports read the request body incrementally, validate one row at a time
+and hand valid rows to the caller in fixed-size batches, so a file of any
+size costs one transaction per batch and memory for one batch. Invalid rows
+are reported by line number and never abort the rest of the file.
+
+Exports are generators over batches of rows, so a response is written out
+as it is read and the table is never loaded at once.
+"""
+import csv
+import io
+import json
+import math
+
+import encoding
+import geo
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CATEGORIES = ('Product', 'Service')
+EXPORT_FIELDS = ('id', 'title', 'description', 'price', 'category', 'location',
+                 'image_url', 'latitude', 'longitude', 'user_id', 'created_at')
+
+def detect_format(content_type, fmt=None):
+    """'ndjson' or 'csv' from an explicit ?format= or the Content-Type."""
+    if fmt:
+        return fmt if fmt in FORMATS else None
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    if mimetype in ('text/csv', 'application/csv'):
+        return 'csv'
+    if mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json-seq'):
+        return 'ndjson'
+    return None
+
+def parse_rows(stream, fmt):
+    """Yield (line_number, raw_dict, error) from a binary stream.
+
+    Bytes that are not UTF-8 fail only the row they appear in.
+    """
+    if fmt == 'csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline='')
+        reader = csv.DictReader(text)
+        for row in reader:
+            if any('\ufffd' in (value or '') for value in row.values() if isinstance(value, str)):
+                yield reader.line_num, None, "Row is not valid UTF-8"
+            else:
+                yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line.decode('utf-8'))
+        except UnicodeDecodeError:
+            yield line_number, None, "Line is not valid UTF-8"
+            continue
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Each line must be a JSON object"
+            continue
+        yield line_number, row, None
+
+def _text(raw, field, max_length, required=True, default=None):
+    value = raw.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if value in (None, ''):
+        if required:
+            raise ValueError(f"'{field}' is required")
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"'{field}' must be a string")
+    if max_length and len(value) > max_length:
+        raise ValueError(f"'{field}' is longer than {max_length} characters")
+    return value
+
+def _number(raw, field, required=True):
+    value = raw.get(field)
+    if value in (None, ''):
+        if required:
+            raise ValueError(f"'{field}' is required")
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{field}' must be a number") from None
+    if not math.isfinite(number):
+        raise ValueError(f"'{field}' must be a finite number")
+    return number
+
+def clean_row(raw):
+    """Validate a raw row into Listing column values. Raises ValueError."""
+    price = _number(raw, 'price')
+    if price < 0:
+        raise ValueError("'price' must not be negative")
+    category = _text(raw, 'category', 50)
+    if category not in CATEGORIES:
+        raise ValueError(f"'category' must be one of {', '.join(CATEGORIES)}")
+    values = {
+        'title': _text(raw, 'title', 100),
+        'description': _text(raw, 'description', None),
+        'price': price,
+        'category': category,
+        'location': _text(raw, 'location', 100, required=False, default='Thika Town'),
+        'image_url': _text(raw, 'image_url', 500, required=False),
+        'latitude': None, 'longitude': None, 'geohash': None,
+    }
+    lat, lng = _number(raw, 'latitude', required=False), _number(raw, 'longitude', required=False)
+    if (lat is None) != (lng is None):
+        raise ValueError("'latitude' and 'longitude' must be given together")
+    if lat is not None:
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError("Coordinates out of range")
+        values.update(latitude=lat, longitude=lng, geohash=geo.encode(lat, lng))
+    return values
+
+def import_rows(rows, insert_batch, batch_size=500, max_errors=1000):
+    """Validate rows from parse_rows and insert them batch by batch.
+
+    insert_batch(values_list) must insert and commit one batch; if it
+    raises, every row of that batch is reported as failed. Returns
+    {"imported", "failed", "errors"} where errors lists at most max_errors
+    {"line", "error"} entries.
+    """
+    report = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(line_number, error):
+        report["failed"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"line": line_number, "error": error})
+
+    def flush(batch):
+        try:
+            insert_batch([values for _, values in batch])
+        except Exception as e:
+            for line_number, _ in batch:
+                fail(line_number, f"Database error: {e.__class__.__name__}")
+        else:
+            report["imported"] += len(batch)
+
+    batch = []
+    for line_number, raw, error in rows:
+        if error is None:
+            try:
+                batch.append((line_number, clean_row(raw)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            fail(line_number, error)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return report
+
+def _export_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def export_ndjson(batches):
+    for rows in batches:
+        yield b''.join(encoding.dumps({field: _export_value(row[field]) for field in EXPORT_FIELDS}) + b'\n'
+                       for row in rows)
+
+def export_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in batches:
+        for row in rows:
+            writer.writerow([_export_value(row[field]) for field in EXPORT_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,163 @@
+"""In-process HTTP response cache for read-heavy JSON routes.
+
+Entries are whole encoded responses keyed by path and normalised query
+string, held in LRU order and bounded by both entry count and total body
+bytes. Each entry carries a strong ETag (a digest of its body) and a set of
+tags naming the data it was built from, e.g. ``listing:12`` or ``user:3``.
+Writers call ``invalidate`` with the tags they touched and exactly the
+affected entries are dropped. That only reaches this process's cache, so
+entries also expire after ``ttl`` seconds, which bounds how long a write made
+elsewhere (another worker, or a ``flask`` CLI command) can go unseen.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, g, request
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'headers', 'tags', 'expires')
+
+    def __init__(self, body, headers, tags):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()
+        self.headers = headers
+        self.tags = frozenset(tags)
+        self.expires = None
+
+    def to_response(self):
+        response = Response(self.body, headers=self.headers)
+        response.set_etag(self.etag)
+        # Clients may keep the body but must revalidate with If-None-Match.
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+class ResponseCache:
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a response computed from data
+        # that changed mid-request is never stored.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry, generation):
+        """Store entry unless an invalidation happened since ``generation``."""
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._remove(key)
+            if self.ttl is not None:
+                entry.expires = time.monotonic() + self.ttl
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in self._by_tag.pop(tag, ()):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def cached(self, view=None, *, variant=None):
+        """Serve a GET view from the cache, with ETag/If-None-Match handling.
+
+        The view declares what its response depends on via ``add_cache_tags``.
+        Only 200 responses are stored. ``variant`` names the representation a
+        request negotiated, e.g. JSON or NDJSON, and each gets its own entry.
+        Streamed responses are buffered before they are sent. Cached routes
+        return bounded pages, and the buffering lets the first response carry
+        an ETag too.
+        """
+        if view is None:
+            return lambda view: self.cached(view, variant=variant)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+            if variant is not None:
+                key += '#' + variant()
+            entry = self.get(key)
+            if entry is None:
+                generation = self.generation
+                g.cache_tags = set()
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+                headers = [(k, v) for k, v in response.headers if k != 'Content-Length']
+                entry = CacheEntry(response.get_data(), headers, g.cache_tags)
+                self.put(key, entry, generation)
+            return entry.to_response()
+        return wrapper
+
+def add_cache_tags(*tags):
+    """Record data dependencies of the response being built by a cached view."""
+    cache_tags = g.get('cache_tags')
+    if cache_tags is not None:
+        cache_tags.update(tags)
@@ -0,0 +1,100 @@
+"""In-memory pub/sub hub that fans chat events out to connected clients.
+
+Each open ``/stream`` connection holds one ``Subscription``, a bounded
+queue keyed by user id. Publishing a message is a dictionary lookup and a
+``put_nowait`` per connected recipient: nothing polls the database.
+Clients that stop reading are cut off once their queue is full, so one
+stalled connection cannot grow memory without bound.
+
+Presence comes from the same registry. A user is online while they have
+at least one open subscription, and their first connect and last
+disconnect are published to their contacts.
+
+Idle connections are cheap for the hub itself. Holding thousands of them
+open needs a server that does not give each one an OS thread, e.g.
+``gunicorn -k gevent``; the queues here cooperate with gevent's monkey
+patching.
+"""
+import json
+import queue
+import threading
+
+HEARTBEAT_SECONDS = 15
+
+class Subscription:
+    __slots__ = ('user_id', 'queue', 'closed')
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.closed = False
+
+class ChatHub:
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id):
+        """Register a connection. Returns (subscription, first_for_user)."""
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            subscriptions = self._subscriptions.setdefault(user_id, set())
+            first = not subscriptions
+            subscriptions.add(subscription)
+        return subscription, first
+
+    def unsubscribe(self, subscription):
+        """Drop a connection. Returns True if it was the user's last one."""
+        subscription.closed = True
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None:
+                return False
+            subscriptions.discard(subscription)
+            if subscriptions:
+                return False
+            del self._subscriptions[subscription.user_id]
+            return True
+
+    def is_online(self, user_id):
+        return user_id in self._subscriptions
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscriptions.values())
+
+    def publish(self, user_ids, event, data):
+        """Queue an SSE event for every open connection of these users."""
+        frame = format_event(event, data)
+        with self._lock:
+            targets = [sub for user_id in user_ids
+                       for sub in self._subscriptions.get(user_id, ())]
+        for subscription in targets:
+            try:
+                subscription.queue.put_nowait(frame)
+                self.published += 1
+            except queue.Full:
+                # Slow consumer: end its stream; the client reconnects
+                # and re-fetches history.
+                self.dropped += 1
+                subscription.closed = True
+
+    def stream(self, subscription, on_close=None):
+        """Generator of SSE frames for one connection, with heartbeats."""
+        try:
+            yield ': connected\n\n'
+            while not subscription.closed:
+                try:
+                    yield subscription.queue.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': ping\n\n'
+        finally:
+            last = self.unsubscribe(subscription)
+            if on_close is not None:
+                on_close(last)
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
@@ -0,0 +1,122 @@
+"""Fast JSON encoding, streamed collections and response compression.
+
+``dumps`` uses orjson when it is installed and the standard library
+otherwise. ``stream_json_array`` and ``stream_ndjson`` serialize items as
+they are produced, in chunks of ``chunk_items``, so a collection is never
+held in memory as one string. NDJSON lets clients render each line as it
+arrives.
+
+``compress_response`` negotiates Content-Encoding from Accept-Encoding.
+It prefers brotli when the brotli package is installed and falls back to
+gzip. Streamed bodies are compressed chunk by chunk with a sync flush
+after each one, so compression never holds back data a client could
+already render.
+"""
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+COMPRESSIBLE = {'application/json', 'application/x-ndjson', 'text/csv', 'text/plain'}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4 # Fast enough for per-request compression
+
+def dumps(obj):
+    """Compact JSON as UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def negotiate_format(accept_mimetypes):
+    """'ndjson' when the client prefers it over JSON, else 'json'."""
+    best = accept_mimetypes.best_match([MIMETYPES['json'], MIMETYPES['ndjson']])
+    return 'ndjson' if best == MIMETYPES['ndjson'] else 'json'
+
+def stream_json_array(items, chunk_items=50):
+    parts = [b'[']
+    for n, item in enumerate(items):
+        if n:
+            parts.append(b',')
+        parts.append(dumps(item))
+        if len(parts) >= 2 * chunk_items:
+            yield b''.join(parts)
+            parts = []
+    parts.append(b']')
+    yield b''.join(parts)
+
+def stream_ndjson(items, chunk_items=50):
+    parts = []
+    for item in items:
+        parts.append(dumps(item) + b'\n')
+        if len(parts) >= chunk_items:
+            yield b''.join(parts)
+            parts = []
+    if parts:
+        yield b''.join(parts)
+
+def negotiate_encoding(accept_encodings):
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def _compressor(content_encoding):
+    if content_encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) # 31: gzip container
+    return (compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            lambda: compressor.flush(zlib.Z_FINISH))
+
+def _compress_stream(chunks, content_encoding):
+    compress, flush, finish = _compressor(content_encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compress(chunk) + flush()
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def compress_response(response, accept_encodings, min_size=1024):
+    """Compress a 200 response of a compressible type if the client accepts it."""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    response.vary.add('Accept-Encoding')
+    content_encoding = negotiate_encoding(accept_encodings)
+    if content_encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, content_encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        compress, _, finish = _compressor(content_encoding)
+        response.set_data(compress(body) + finish())
+    response.headers['Content-Encoding'] = content_encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # Same resource, different bytes: keep If-None-Match working.
+        response.set_etag(etag, weak=True)
+    return response
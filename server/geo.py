@@ -0,0 +1,132 @@
+"""Geohash indexing and radius search for listing coordinates.
+
+A geohash interleaves longitude and latitude bits into a base32 string, so
+every prefix names a rectangular cell and points in the same cell share a
+prefix. With an ordinary B-tree index on the geohash column, "everything in
+cell X" is a single range seek (``X <= geohash < X + '{'``). A radius query
+covers the circle's bounding box with a few dozen cells, at the finest
+precision that allows, and then refines the candidates with the exact
+haversine distance.
+
+Searching a whole radius at once reads every listing in it, which in a
+dense town is most of the table. ``ring_radii`` lets callers search
+outward instead: a small circle first, widened until it holds enough
+results. Each ring ranks its candidates in SQL with ``approx_distance`` and
+returns only the nearest few.
+"""
+import math
+
+from sqlalchemy import and_, or_
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# One past 'z' in ASCII: every hash starting with a prefix sorts below prefix + '{'.
+PREFIX_END = '{'
+STORED_PRECISION = 9  # ~4.8m x 4.8m cells
+MAX_COVERING_CELLS = 32  # Index range seeks per radius query
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def encode(lat, lng, precision=STORED_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+def cell_size(precision):
+    """(height, width) of a cell in degrees of latitude and longitude."""
+    lng_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision - lng_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+def _bounding_box(lat, lng, radius_km):
+    """(south, north, west, east) in degrees around the circle; west/east are
+    None when the box spans every longitude."""
+    dlat = radius_km / KM_PER_DEGREE
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    # Longitude degrees shrink towards the poles; size the box at the
+    # circle's poleward edge so it still contains the whole circle.
+    shrink = math.cos(math.radians(max(abs(south), abs(north))))
+    if shrink < 1e-6 or dlat / shrink >= 180.0:
+        return south, north, None, None
+    return south, north, lng - dlat / shrink, lng + dlat / shrink
+
+def covering_cells(lat, lng, radius_km, max_cells=MAX_COVERING_CELLS):
+    """Geohash cells that together contain the circle.
+
+    The finest precision whose grid covers the bounding box in at most
+    max_cells cells, so a big radius in an empty area does not pull in the
+    dense town next to it through one huge cell.
+    """
+    south, north, west, east = _bounding_box(lat, lng, radius_km)
+    for precision in range(STORED_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        first_row = math.floor((south + 90.0) / height)
+        rows = min(math.floor((north + 90.0) / height), round(180.0 / height) - 1) - first_row + 1
+        if west is None:
+            first_col, cols = 0, round(360.0 / width)
+        else:
+            first_col = math.floor((west + 180.0) / width)
+            cols = min(math.floor((east + 180.0) / width) - first_col + 1, round(360.0 / width))
+        if rows * cols <= max_cells or precision == 1:
+            break
+    cells = set()
+    for row in range(first_row, first_row + rows):
+        cell_lat = (row + 0.5) * height - 90.0
+        for col in range(first_col, first_col + cols):
+            cell_lng = ((col + 0.5) * width) % 360.0 - 180.0
+            cells.add(encode(cell_lat, cell_lng, precision))
+    return sorted(cells)
+
+def ring_radii(radius_km, first_km, growth=4):
+    """Radii of successively wider search rings, ending at radius_km."""
+    ring_km = min(first_km, radius_km)
+    yield ring_km
+    while ring_km < radius_km:
+        ring_km = min(ring_km * growth, radius_km)
+        yield ring_km
+
+def nearby_clause(geohash_col, lat_col, lng_col, lat, lng, radius_km):
+    """SQL predicate selecting candidate rows for a radius search.
+
+    The geohash ranges are what the index seeks on; the bounding box trims
+    the corners of the covering cells before rows are ranked or returned.
+    """
+    ranges = [and_(geohash_col >= cell, geohash_col < cell + PREFIX_END)
+              for cell in covering_cells(lat, lng, radius_km)]
+    south, north, west, east = _bounding_box(lat, lng, radius_km)
+    clause = and_(or_(*ranges), lat_col.between(south, north))
+    if west is not None and -180.0 <= west and east <= 180.0:
+        # Left out where the box wraps the antimeridian.
+        clause = and_(clause, lng_col.between(west, east))
+    return clause
+
+def approx_distance(lat_col, lng_col, lat, lng):
+    """Squared equirectangular distance from (lat, lng), for ranking in SQL.
+
+    Plain arithmetic, so any database can evaluate it. Within a search
+    radius of up to ~100 km it orders points as haversine does, except for
+    near-ties.
+    """
+    dlat = lat_col - lat
+    dlng = (lng_col - lng) * math.cos(math.radians(lat))
+    return dlat * dlat + dlng * dlng
@@ -0,0 +1,158 @@
+"""Authenticated identity: cached user lookups and token revocation.
+
+``TTLCache`` holds a snapshot of each recently seen user, so JWT-protected
+routes do not query the user table on every request. Entries expire after a
+TTL, which bounds how stale another process's copy can be, and are dropped
+at once in this process when a profile is updated.
+
+``RevocationList`` records logged-out tokens by ``jti`` in a table and
+mirrors them into a Bloom filter. A token the filter has never seen is
+valid without touching the database; only probable hits, including the
+filter's false positives, are confirmed by a query. Other processes pick up
+new revocations on the next sync, at most ``sync_interval`` seconds later.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+class TTLCache:
+    """A bounded LRU mapping whose entries expire ``ttl`` seconds after they are stored."""
+    def __init__(self, max_entries=10_000, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class RevocationList:
+    def __init__(self, db, model, capacity=100_000, error_rate=0.001, sync_interval=5.0):
+        self.db = db
+        self.model = model
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._filter = BloomFilter(capacity, error_rate)
+        self._filter_capacity = capacity
+        self._count = 0
+        self._last_id = 0
+        self._last_sync = float('-inf')
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.db_lookups = 0
+        self.false_positives = 0
+        self.sync_errors = 0
+
+    def revoke(self, jti, user_id, expires_at):
+        """Record a token as revoked; it stops working in this process at once."""
+        self.db.session.add(self.model(jti=jti, user_id=user_id, expires_at=expires_at))
+        self.db.session.commit()
+        with self._lock:
+            self._filter.add(jti)
+
+    def is_revoked(self, jti):
+        self.checks += 1
+        self._maybe_sync()
+        if jti not in self._filter:
+            return False
+        self.db_lookups += 1
+        revoked = self.db.session.execute(
+            self.db.select(self.model.id).where(self.model.jti == jti)
+        ).first() is not None
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    def _maybe_sync(self):
+        if time.monotonic() - self._last_sync < self.sync_interval:
+            return
+        # One request pays for the sync; the rest keep using the current filter.
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._sync()
+        except Exception:
+            # Keep serving from the current filter; this process's own
+            # revocations are already in it. Retried after sync_interval.
+            self.db.session.rollback()
+            self.sync_errors += 1
+        finally:
+            self._last_sync = time.monotonic()
+            self._lock.release()
+
+    def _sync(self):
+        Revoked = self.model
+        rows = self.db.session.execute(
+            self.db.select(Revoked.id, Revoked.jti).where(Revoked.id > self._last_id).order_by(Revoked.id)
+        ).all()
+        for row_id, jti in rows:
+            self._filter.add(jti)
+            self._last_id = row_id
+        self._count += len(rows)
+        if self._count > self._filter_capacity:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Forget expired tokens, which their exp claim already rejects, and refill the filter."""
+        now = datetime.utcnow()
+        self.db.session.execute(self.db.delete(self.model).where(self.model.expires_at < now))
+        self.db.session.commit()
+        jtis = self.db.session.execute(self.db.select(self.model.jti)).scalars().all()
+        # Leave headroom so a long list of live revocations does not rebuild on every sync.
+        capacity = max(self.capacity, 2 * len(jtis))
+        fresh = BloomFilter(capacity, self.error_rate)
+        for jti in jtis:
+            fresh.add(jti)
+        self._filter, self._filter_capacity, self._count = fresh, capacity, len(jtis)
+
+    def stats(self):
+        return {
+            "checks": self.checks,
+            "db_lookups": self.db_lookups,
+            "false_positives": self.false_positives,
+            "sync_errors": self.sync_errors,
+            "entries": self._count,
+        }
@@ -0,0 +1,160 @@
+"""Content-addressed image storage and background variant generation.
+
+Uploads are streamed to disk while being hashed and stored once per
+distinct content under ``originals/<sha256[:2]>/<sha256>.<ext>``, so
+re-uploading the same photo costs nothing and two files with the same
+name can no longer overwrite each other. Resized WebP variants are built
+off the request thread in a process pool and written to
+``variants/<sha256>/<name>.webp``.
+
+Pillow is only needed by the worker processes; without it variant jobs
+fail and the API keeps serving the original.
+"""
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+
+CHUNK_SIZE = 64 * 1024
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+
+# Longest edge in pixels for each variant the API serves.
+VARIANTS = {
+    'card': 480,
+    'detail': 1280,
+}
+
+STATUS_NONE = 'none'  # No uploaded image (or an external image_url)
+STATUS_PENDING = 'pending'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+def original_relpath(digest, ext):
+    return f"originals/{digest[:2]}/{digest}.{ext}"
+
+def variant_relpath(digest, name):
+    return f"variants/{digest}/{name}.webp"
+
+def variants_exist(root, digest):
+    return all(os.path.exists(os.path.join(root, variant_relpath(digest, name)))
+               for name in VARIANTS)
+
+def store_upload(stream, filename, root):
+    """Stream an upload into content-addressed storage.
+
+    Returns ``(digest, relpath, created)``; ``created`` is False when the
+    same content was already stored. Raises ValueError for extensions
+    outside ALLOWED_EXTENSIONS.
+    """
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext == 'jpeg':
+        ext = 'jpg'
+    if ext not in ALLOWED_EXTENSIONS:
+        raise ValueError(f"Unsupported image type: {filename}")
+
+    os.makedirs(root, exist_ok=True)
+    sha = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=root, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+                out.write(chunk)
+        digest = sha.hexdigest()
+        relpath = original_relpath(digest, ext)
+        target = os.path.join(root, relpath)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+            return digest, relpath, False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+        return digest, relpath, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def generate_variants(source, root, digest):
+    """Worker entry point: write every VARIANTS size of source as WebP."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        for name, edge in VARIANTS.items():
+            target = os.path.join(root, variant_relpath(digest, name))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            variant = image.copy()
+            variant.thumbnail((edge, edge))
+            # A private temp file per job: another job for the same digest,
+            # e.g. from `flask process-images`, may be writing concurrently.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    variant.save(out, 'WEBP', quality=80, method=4)
+                os.replace(tmp_path, target)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+    return digest
+
+class ImagePipeline:
+    """Runs generate_variants jobs in a lazily started process pool.
+
+    At most one job per digest is queued at a time; its on_done updates
+    every listing using the image, including ones created while it ran.
+    """
+
+    def __init__(self, root, max_workers=2):
+        self.root = root
+        self.max_workers = max_workers
+        self._executor = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn, not fork: children must not inherit the parent's
+            # SQLite connections or server threads.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    def submit(self, digest, relpath, on_done):
+        """Queue variant generation; on_done(digest, ok) runs when it finishes.
+
+        Returns the job's future, or None when a job for digest is already
+        queued or running.
+        """
+        with self._lock:
+            if digest in self._in_flight:
+                return None
+            self._in_flight.add(digest)
+        source = os.path.join(self.root, relpath)
+        try:
+            future = self._pool().submit(generate_variants, source, self.root, digest)
+        except BaseException:
+            self._done(digest)
+            raise
+        future.add_done_callback(lambda f: self._finish(f, digest, on_done))
+        return future
+
+    def _done(self, digest):
+        with self._lock:
+            self._in_flight.discard(digest)
+
+    def _finish(self, future, digest, on_done):
+        # Released before on_done: a listing committed after its UPDATE
+        # has then started a job of its own.
+        self._done(digest)
+        on_done(digest, future.exception() is None)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
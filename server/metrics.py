@@ -0,0 +1,233 @@
+"""Per-route request instrumentation exposed in Prometheus text format.
+
+For every request this records, labelled by Flask endpoint and method:
+
+* latency in a histogram (``talalink_http_request_duration_seconds``),
+* response body size in a histogram (``talalink_http_response_bytes``),
+  streamed bodies included and counted as they are sent,
+* SQL statements and their total time, captured from SQLAlchemy engine
+  events, and response status codes.
+
+Requests slower than ``slow_request_ms`` are logged with the SQL they ran.
+When ``profile_dir`` is set, requests are profiled with cProfile if they
+win a ``profile_sample_rate`` draw, or if ``profile_token`` is set and they
+carry it in an ``X-Profile`` header. The stats are written as ``.prof``
+files for ``python -m pstats`` or snakeviz; only the newest
+``profile_max_files`` are kept.
+
+Other subsystems publish their own numbers through ``register``.
+"""
+import cProfile
+import hmac
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+MAX_LOGGED_STATEMENTS = 50
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+class Metrics:
+    def __init__(self, app, engines, slow_request_ms=500, profile_dir=None,
+                 profile_sample_rate=0.0, profile_token=None, profile_max_files=100,
+                 query_count_header=False):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.profile_dir = profile_dir
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_token = profile_token
+        self.profile_max_files = profile_max_files
+        self.query_count_header = query_count_header
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._latency = {}
+        self._sizes = {}
+        self._statuses = {}
+        self._sql_count = {}
+        self._sql_seconds = {}
+        self._collectors = []
+
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def register(self, collect):
+        """Add a collector: collect() yields (name, kind, help, value) tuples,
+        kind being 'gauge' or 'counter'. It runs on every scrape."""
+        self._collectors.append(collect)
+
+    # --- SQL ---
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        if has_request_context() and 'sql_count' in g:
+            endpoint = request.endpoint or 'unmatched'
+            g.sql_count += 1
+            g.sql_seconds += elapsed
+            if len(g.sql_statements) < MAX_LOGGED_STATEMENTS:
+                g.sql_statements.append((elapsed, statement))
+        else:
+            endpoint = 'background'
+        with self._lock:
+            self._sql_count[endpoint] = self._sql_count.get(endpoint, 0) + 1
+            self._sql_seconds[endpoint] = self._sql_seconds.get(endpoint, 0.0) + elapsed
+
+    # --- REQUESTS ---
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.sql_statements = []
+        if self.profile_dir and (self._profile_requested() or random.random() < self.profile_sample_rate):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def _profile_requested(self):
+        supplied = request.headers.get('X-Profile')
+        return (self.profile_token is not None and supplied is not None
+                and hmac.compare_digest(supplied.encode(), self.profile_token.encode()))
+
+    def _after_request(self, response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        key = (request.endpoint or 'unmatched', request.method)
+        with self._lock:
+            self._latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            status_key = key + (response.status_code,)
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+        if response.is_streamed:
+            response.response = self._count_stream(response.response, key)
+        else:
+            self._observe_size(key, response.calculate_content_length() or 0)
+        if self.query_count_header:
+            response.headers['X-Query-Count'] = str(g.sql_count)
+        if elapsed * 1000 >= self.slow_request_ms:
+            self._log_slow(elapsed)
+        return response
+
+    def _teardown_request(self, exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            name = f"{request.endpoint or 'unmatched'}-{time.time():.3f}.prof"
+            profiler.dump_stats(os.path.join(self.profile_dir, name))
+            self._prune_profiles()
+
+    def _prune_profiles(self):
+        """Delete the oldest .prof files beyond profile_max_files."""
+        with self._profile_lock:
+            with os.scandir(self.profile_dir) as entries:
+                files = sorted((entry.stat().st_mtime, entry.path) for entry in entries
+                               if entry.name.endswith('.prof') and entry.is_file())
+            for _, path in files[:max(len(files) - self.profile_max_files, 0)]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _observe_size(self, key, size):
+        with self._lock:
+            self._sizes.setdefault(key, Histogram(SIZE_BUCKETS)).observe(size)
+
+    def _count_stream(self, iterable, key):
+        total = 0
+        try:
+            for chunk in iterable:
+                total += len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                yield chunk
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+            self._observe_size(key, total)
+
+    def _log_slow(self, elapsed):
+        statements = '\n'.join(f"  {seconds * 1000:8.1f}ms  {' '.join(statement.split())[:300]}"
+                               for seconds, statement in g.sql_statements)
+        self.app.logger.warning(
+            "Slow request %s %s: %.0fms, %d SQL statements in %.0fms\n%s",
+            request.method, request.full_path, elapsed * 1000,
+            g.sql_count, g.sql_seconds * 1000, statements)
+
+    # --- EXPOSITION ---
+
+    def render(self):
+        """All metrics in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            latency = dict(self._latency)
+            sizes = dict(self._sizes)
+            statuses = dict(self._statuses)
+            sql_count = dict(self._sql_count)
+            sql_seconds = dict(self._sql_seconds)
+
+        lines += ['# HELP talalink_http_request_duration_seconds Request latency by endpoint.',
+                  '# TYPE talalink_http_request_duration_seconds histogram']
+        for (endpoint, method), histogram in sorted(latency.items()):
+            lines += histogram.lines('talalink_http_request_duration_seconds',
+                                     f'endpoint="{endpoint}",method="{method}"')
+        lines += ['# HELP talalink_http_response_bytes Response body size by endpoint.',
+                  '# TYPE talalink_http_response_bytes histogram']
+        for (endpoint, method), histogram in sorted(sizes.items()):
+            lines += histogram.lines('talalink_http_response_bytes',
+                                     f'endpoint="{endpoint}",method="{method}"')
+        lines += ['# HELP talalink_http_responses_total Responses by endpoint and status.',
+                  '# TYPE talalink_http_responses_total counter']
+        for (endpoint, method, status), count in sorted(statuses.items()):
+            lines.append(f'talalink_http_responses_total{{endpoint="{endpoint}",method="{method}",'
+                         f'status="{status}"}} {count}')
+        lines += ['# HELP talalink_sql_statements_total SQL statements executed, by endpoint.',
+                  '# TYPE talalink_sql_statements_total counter']
+        lines += [f'talalink_sql_statements_total{{endpoint="{endpoint}"}} {count}'
+                  for endpoint, count in sorted(sql_count.items())]
+        lines += ['# HELP talalink_sql_duration_seconds_total Time spent in SQL, by endpoint.',
+                  '# TYPE talalink_sql_duration_seconds_total counter']
+        lines += [f'talalink_sql_duration_seconds_total{{endpoint="{endpoint}"}} {seconds}'
+                  for endpoint, seconds in sorted(sql_seconds.items())]
+
+        for collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                self.app.logger.warning("Metrics collector %s failed: %s", collect.__name__, e)
+                continue
+            for name, kind, help_text, value in samples:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,24 @@
+"""Index listing prices for min_price/max_price filters
+
+Revision ID: 5b2e8f61c7d4
+Revises: d4e7b1c90a3f
+Create Date: 2026-10-19 09:04:51.227604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8f61c7d4'
+down_revision = 'd4e7b1c90a3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_listing_price', 'listing', ['price'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_listing_price', table_name='listing')
@@ -0,0 +1,220 @@
+"""Canonical schema and indexes for hot lookups
+
+Brings any existing database to the schema in models.py. Databases built by
+the initial revision have the never-used ``users``/``listings`` tables;
+databases built by ``db.create_all()`` have ``user``/``listing`` but may
+predate later columns and tables. Every step checks what is already there,
+so the revision is safe to run against either.
+
+Revision ID: 8c1f3a9d2b47
+Revises: 447e14e1d091
+Create Date: 2026-10-18 10:12:40.118362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1f3a9d2b47'
+down_revision = '447e14e1d091'
+branch_labels = None
+depends_on = None
+
+
+def tables():
+    """(name, columns and constraints) in dependency order, as in models.py."""
+    return [
+        ('user', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password', sa.String(length=200), nullable=False),
+            sa.Column('phone_number', sa.String(length=20), nullable=True),
+            sa.Column('is_verified', sa.Boolean(), nullable=True),
+            sa.Column('verification_token', sa.String(length=100), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('username'),
+            sa.UniqueConstraint('verification_token'),
+        ]),
+        ('listing', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=False),
+            sa.Column('price', sa.Float(), nullable=False),
+            sa.Column('category', sa.String(length=50), nullable=False),
+            sa.Column('location', sa.String(length=100), nullable=True),
+            sa.Column('image_url', sa.String(length=500), nullable=True),
+            sa.Column('image_hash', sa.String(length=64), nullable=True),
+            sa.Column('image_status', sa.String(length=10), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('latitude', sa.Float(), nullable=True),
+            sa.Column('longitude', sa.Float(), nullable=True),
+            sa.Column('geohash', sa.String(length=12), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('outbox_email', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('recipient', sa.String(length=120), nullable=False),
+            sa.Column('subject', sa.String(length=200), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('status', sa.String(length=10), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+            sa.Column('claim_token', sa.String(length=16), nullable=True),
+            sa.Column('last_error', sa.String(length=500), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+        ('conversation', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('listing_id', sa.Integer(), nullable=True),
+            sa.Column('buyer_id', sa.Integer(), nullable=False),
+            sa.Column('seller_id', sa.Integer(), nullable=False),
+            sa.Column('last_message_preview', sa.String(length=140), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['buyer_id'], ['user.id'], ),
+            sa.ForeignKeyConstraint(['listing_id'], ['listing.id'], ),
+            sa.ForeignKeyConstraint(['seller_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('listing_id', 'buyer_id', name='uq_conversation_listing_buyer'),
+        ]),
+        ('conversation_member', [
+            sa.Column('conversation_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('last_message_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id'], ),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('conversation_id', 'user_id'),
+        ]),
+        ('chat_message', [
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('conversation_id', sa.Integer(), nullable=False),
+            sa.Column('sender_id', sa.Integer(), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['conversation_id'], ['conversation.id'], ),
+            sa.ForeignKeyConstraint(['sender_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+        ]),
+    ]
+
+# (name, table, columns, unique)
+INDEXES = [
+    ('ix_listing_user_id', 'listing', ['user_id'], False),
+    ('ix_listing_created_at_id', 'listing', ['created_at', 'id'], False),
+    ('ix_listing_category_created_at_id', 'listing', ['category', 'created_at', 'id'], False),
+    ('ix_listing_location_created_at_id', 'listing', ['location', 'created_at', 'id'], False),
+    ('ix_listing_geohash', 'listing', ['geohash'], False),
+    ('ix_listing_image_hash', 'listing', ['image_hash'], False),
+    ('ix_outbox_email_claim_token', 'outbox_email', ['claim_token'], False),
+    ('ix_outbox_email_status_next_attempt_at', 'outbox_email', ['status', 'next_attempt_at'], False),
+    ('ix_conversation_member_user_last_message', 'conversation_member',
+     ['user_id', 'last_message_at', 'conversation_id'], False),
+    ('ix_chat_message_conversation_id_id', 'chat_message', ['conversation_id', 'id'], False),
+]
+
+LEGACY_TABLES = ('listings', 'users') # From 447e14e1d091, children first
+
+# The listing search index as search.py defined it at this revision. Inlined
+# so that later changes to search.py cannot change what this revision does.
+FTS_TABLE = 'listing_fts'
+FTS_TRIGGERS = ('listing_fts_ai', 'listing_fts_ad', 'listing_fts_au')
+FTS_SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS listing_fts USING fts5(
+        title, description, category, location,
+        content='listing', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS listing_fts_ai AFTER INSERT ON listing BEGIN
+        INSERT INTO listing_fts(rowid, title, description, category, location)
+        VALUES (new.id, new.title, new.description, new.category, new.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS listing_fts_ad AFTER DELETE ON listing BEGIN
+        INSERT INTO listing_fts(listing_fts, rowid, title, description, category, location)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS listing_fts_au AFTER UPDATE ON listing BEGIN
+        INSERT INTO listing_fts(listing_fts, rowid, title, description, category, location)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.location);
+        INSERT INTO listing_fts(rowid, title, description, category, location)
+        VALUES (new.id, new.title, new.description, new.category, new.location);
+    END""",
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = set(inspector.get_table_names())
+
+    for name, elements in tables():
+        if name not in existing:
+            op.create_table(name, *elements)
+            continue
+        # Tables from create_all() may predate later columns. Only nullable
+        # columns were ever added, so ALTER TABLE ADD COLUMN covers them.
+        present = {column['name'] for column in inspector.get_columns(name)}
+        for element in elements:
+            if isinstance(element, sa.Column) and element.name not in present:
+                op.add_column(name, element)
+                if element.name == 'verification_token':
+                    op.create_index('ix_user_verification_token', name, [element.name], unique=True)
+
+    inspector = sa.inspect(bind)
+    for name, table, columns, unique in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=unique)
+
+    for name in LEGACY_TABLES:
+        if name in existing and bind.execute(sa.text(f'SELECT 1 FROM "{name}" LIMIT 1')).first() is None:
+            op.drop_table(name)
+
+    if bind.dialect.name == 'sqlite':
+        for statement in FTS_SCHEMA:
+            op.execute(statement)
+        if FTS_TABLE not in existing:
+            # Index the listings that were there before the table.
+            op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    existing = set(sa.inspect(bind).get_table_names())
+    if bind.dialect.name == 'sqlite':
+        for trigger in FTS_TRIGGERS:
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    for name in ('chat_message', 'conversation_member', 'conversation', 'outbox_email'):
+        if name in existing:
+            op.drop_table(name)
+    # user and listing predate this revision on create_all() databases, so
+    # only the index added here is removed from them.
+    if 'listing' in existing:
+        op.drop_index('ix_listing_user_id', table_name='listing')
+    if 'users' not in existing:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=128), nullable=False),
+        sa.Column('is_artisan', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username')
+        )
+    if 'listings' not in existing:
+        op.create_table('listings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('category', sa.String(length=50), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
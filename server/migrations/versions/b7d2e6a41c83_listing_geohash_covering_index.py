@@ -0,0 +1,28 @@
+"""Cover nearby search with a (geohash, latitude, longitude) index
+
+Revision ID: b7d2e6a41c83
+Revises: e31a7c4b9f05
+Create Date: 2026-10-20 10:17:36.804215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e6a41c83'
+down_revision = 'e31a7c4b9f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_listing_geohash_latitude_longitude', 'listing',
+                    ['geohash', 'latitude', 'longitude'], unique=False)
+    # A prefix of the new index.
+    op.drop_index('ix_listing_geohash', table_name='listing')
+
+
+def downgrade():
+    op.create_index('ix_listing_geohash', 'listing', ['geohash'], unique=False)
+    op.drop_index('ix_listing_geohash_latitude_longitude', table_name='listing')
@@ -0,0 +1,41 @@
+"""Reindex listings for search only when an indexed column changes
+
+Revision ID: e31a7c4b9f05
+Revises: 5b2e8f61c7d4
+Create Date: 2026-10-19 11:42:18.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e31a7c4b9f05'
+down_revision = '5b2e8f61c7d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TRIGGER IF EXISTS listing_fts_au')
+    op.execute("""CREATE TRIGGER listing_fts_au
+        AFTER UPDATE OF title, description, category, location ON listing BEGIN
+        INSERT INTO listing_fts(listing_fts, rowid, title, description, category, location)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.location);
+        INSERT INTO listing_fts(rowid, title, description, category, location)
+        VALUES (new.id, new.title, new.description, new.category, new.location);
+    END""")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TRIGGER IF EXISTS listing_fts_au')
+    op.execute("""CREATE TRIGGER listing_fts_au AFTER UPDATE ON listing BEGIN
+        INSERT INTO listing_fts(listing_fts, rowid, title, description, category, location)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.location);
+        INSERT INTO listing_fts(rowid, title, description, category, location)
+        VALUES (new.id, new.title, new.description, new.category, new.location);
+    END""")
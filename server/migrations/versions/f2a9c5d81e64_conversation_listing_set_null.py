@@ -0,0 +1,48 @@
+"""Null a conversation's listing_id when its listing is deleted
+
+The foreign key was created without a name, so the existing one is found by
+reflection (SQLite reports no name; PostgreSQL calls it
+``conversation_listing_id_fkey``) and replaced with a named one. On SQLite
+the batch operation rebuilds the table.
+
+Revision ID: f2a9c5d81e64
+Revises: b7d2e6a41c83
+Create Date: 2026-10-21 09:42:03.511870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a9c5d81e64'
+down_revision = 'b7d2e6a41c83'
+branch_labels = None
+depends_on = None
+
+FK_NAME = 'fk_conversation_listing_id_listing'
+# Lets the batch operation name an unnamed reflected constraint on SQLite.
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def existing_fk_name():
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys('conversation'):
+        if fk['constrained_columns'] == ['listing_id']:
+            return fk['name'] or FK_NAME
+    return None
+
+
+def rebuild_listing_fk(ondelete):
+    name = existing_fk_name()
+    with op.batch_alter_table('conversation', naming_convention=NAMING_CONVENTION) as batch_op:
+        if name is not None:
+            batch_op.drop_constraint(name, type_='foreignkey')
+        batch_op.create_foreign_key(FK_NAME, 'listing', ['listing_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    rebuild_listing_fk('SET NULL')
+
+
+def downgrade():
+    rebuild_listing_fk(None)
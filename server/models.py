@@ -1,41 +1,120 @@
+"""The canonical TalaLink schema.
+
+Every table lives here and app.py binds ``db`` to the Flask app. The schema
+is created and upgraded by the Alembic revisions in migrations/ (``flask db
+upgrade``), which must be kept in step with these models.
+"""
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 
+import images
+import outbox
+from storage import RoutingSession
+
 metadata = MetaData()
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 
 class User(db.Model):
-    __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
-    is_artisan = db.Column(db.Boolean, default=False)
-
-    # Relationships
-    listings = db.relationship('Listing', backref='owner', lazy=True)
-
-    def to_dict(self):
-        return {
-            "id": self.id, 
-            "username": self.username, 
-            "email": self.email, 
-            "is_artisan": self.is_artisan
-        }
+    password = db.Column(db.String(200), nullable=False)
+    phone_number = db.Column(db.String(20), nullable=True) # For WhatsApp integration
+    is_verified = db.Column(db.Boolean, default=True)
+    verification_token = db.Column(db.String(100), unique=True)
+    listings = db.relationship('Listing', backref='author', lazy=True)
 
 class Listing(db.Model):
-    __tablename__ = 'listings'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=False)
     price = db.Column(db.Float, nullable=False)
-    description = db.Column(db.Text)
-    category = db.Column(db.String(50))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "price": self.price,
-            "category": self.category
-        }
\ No newline at end of file
+    category = db.Column(db.String(50), nullable=False) # 'Product' or 'Service'
+    location = db.Column(db.String(100), default='Thika Town')
+    image_url = db.Column(db.String(500))
+    image_hash = db.Column(db.String(64), nullable=True, index=True) # sha256 of an uploaded original
+    image_status = db.Column(db.String(10), default=images.STATUS_NONE)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True) # See geo.py
+
+    # Keyset pagination walks (created_at, id) newest-first; the filtered
+    # variants keep the equality column in front so a page never scans.
+    __table_args__ = (
+        db.Index('ix_listing_created_at_id', 'created_at', 'id'),
+        db.Index('ix_listing_category_created_at_id', 'category', 'created_at', 'id'),
+        db.Index('ix_listing_location_created_at_id', 'location', 'created_at', 'id'),
+        # Price ranges seek here and sort only the matching rows, instead of
+        # walking the whole (created_at, id) index looking for them.
+        db.Index('ix_listing_price', 'price'),
+        # Nearby search seeks geohash cells and ranks by distance from the
+        # index alone, reading full rows only for the listings it returns.
+        db.Index('ix_listing_geohash_latitude_longitude', 'geohash', 'latitude', 'longitude'),
+    )
+
+class OutboxEmail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=outbox.STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(16), nullable=True, index=True)
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbox_email_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+class Conversation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # Conversations outlive their listing; list_conversations outer-joins it.
+    listing_id = db.Column(db.Integer, db.ForeignKey('listing.id', name='fk_conversation_listing_id_listing',
+                                                     ondelete='SET NULL'), nullable=True)
+    buyer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    seller_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    last_message_preview = db.Column(db.String(140), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('listing_id', 'buyer_id', name='uq_conversation_listing_buyer'),
+    )
+
+class ConversationMember(db.Model):
+    # One row per participant, so "my latest conversations" is a single
+    # index range on (user_id, last_message_at).
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    last_message_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_conversation_member_user_last_message',
+                 'user_id', 'last_message_at', 'conversation_id'),
+    )
+
+class ChatMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # History is paged backwards by id within a conversation.
+    __table_args__ = (
+        db.Index('ix_chat_message_conversation_id_id', 'conversation_id', 'id'),
+    )
+
+class RevokedToken(db.Model):
+    # Logged-out access tokens, until they would have expired anyway.
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,157 @@
+"""Durable email outbox and the background sender that drains it.
+
+Routes never talk to SMTP. They add an outbox row in the same transaction
+as the data the email is about, so an email exists if and only if its
+transaction committed. ``OutboxSender`` drains pending rows in batches over
+a single SMTP connection per batch and reschedules failures with
+exponential backoff, giving up after ``max_attempts``.
+
+Rows are claimed by stamping them with a random token and pushing
+``next_attempt_at`` out by a lease, so several processes can run a sender
+without sending the same row twice while the lease holds.
+"""
+import random
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_DEAD = 'dead'
+
+class OutboxSender:
+    def __init__(self, app, db, model, mail, batch_size=50, poll_interval=2.0,
+                 max_attempts=8, base_backoff=30, max_backoff=3600, lease=300):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.mail = mail
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the background thread; later calls are no-ops."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='outbox-sender', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+
+    def notify(self):
+        """Wake the sender early, e.g. right after a signup commits."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    sent = self.drain_once()
+            except Exception as e:
+                print(f"Outbox drain failed: {e}")
+                sent = 0
+            # A full batch suggests more is waiting; otherwise sleep until
+            # the next poll or until notify() is called.
+            if sent < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def backoff(self, attempts):
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def _claim(self):
+        Outbox, session = self.model, self.db.session
+        now = datetime.utcnow()
+        ids = session.execute(
+            self.db.select(Outbox.id)
+            .where(Outbox.status == STATUS_PENDING, Outbox.next_attempt_at <= now)
+            .order_by(Outbox.next_attempt_at, Outbox.id)
+            .limit(self.batch_size)
+        ).scalars().all()
+        if not ids:
+            return []
+        token = secrets.token_hex(8)
+        session.execute(
+            self.db.update(Outbox)
+            .where(Outbox.id.in_(ids), Outbox.status == STATUS_PENDING,
+                   Outbox.next_attempt_at <= now)
+            .values(claim_token=token, next_attempt_at=now + timedelta(seconds=self.lease))
+        )
+        session.commit()
+        return session.execute(
+            self.db.select(Outbox).where(Outbox.claim_token == token).order_by(Outbox.id)
+        ).scalars().all()
+
+    def drain_once(self):
+        """Send one batch. Returns the number of emails delivered."""
+        batch = self._claim()
+        if not batch:
+            return 0
+        sent = 0
+        try:
+            with self.mail.connect() as connection:
+                for email in batch:
+                    try:
+                        connection.send(Message(email.subject, recipients=[email.recipient], body=email.body))
+                    except Exception as e:
+                        self._failed(email, e)
+                    else:
+                        email.status = STATUS_SENT
+                        email.sent_at = datetime.utcnow()
+                        sent += 1
+        except Exception as e:
+            # Connecting (or the connection itself) failed: retry whatever
+            # was not delivered.
+            for email in batch:
+                if email.status == STATUS_PENDING and email.claim_token is not None:
+                    self._failed(email, e)
+        for email in batch:
+            email.claim_token = None
+        self.db.session.commit()
+        return sent
+
+    def _failed(self, email, error):
+        email.attempts += 1
+        email.last_error = str(error)[:500]
+        if email.attempts >= self.max_attempts:
+            email.status = STATUS_DEAD
+        else:
+            email.next_attempt_at = datetime.utcnow() + self.backoff(email.attempts)
+        # Mark as handled so a connection failure later in the batch does
+        # not count this attempt twice.
+        email.claim_token = None
+
+    def stats(self):
+        Outbox, session = self.model, self.db.session
+        rows = session.execute(
+            self.db.select(Outbox.status, self.db.func.count(), self.db.func.min(Outbox.created_at))
+            .where(Outbox.status.in_([STATUS_PENDING, STATUS_DEAD]))
+            .group_by(Outbox.status)
+        ).all()
+        counts = {status: (count, oldest) for status, count, oldest in rows}
+        pending, oldest = counts.get(STATUS_PENDING, (0, None))
+        return {
+            "pending": pending,
+            "dead": counts.get(STATUS_DEAD, (0, None))[0],
+            "oldest_pending_age_seconds":
+                (datetime.utcnow() - oldest).total_seconds() if oldest else 0,
+        }
@@ -0,0 +1,85 @@
+"""Password hashing off the request path, with admission control and throttles.
+
+bcrypt is deliberately CPU-heavy. Running it inline lets a burst of logins
+occupy every request worker, so hashing and verification go through a small
+dedicated pool instead. The pool admits at most ``workers + queue_depth``
+jobs; beyond that callers get ``HasherSaturated`` at once instead of
+queueing behind work that will time out anyway. (The bcrypt extension
+releases the GIL while hashing, so threads give real parallelism here.)
+
+``SlidingWindowLimiter`` caps attempts per client IP and per account so
+hashing cannot be used as a work amplifier.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+class HasherSaturated(Exception):
+    """The hashing pool is full or did not answer in time."""
+
+class PasswordHasher:
+    def __init__(self, bcrypt, log_rounds=12, workers=4, queue_depth=16, timeout=5.0):
+        self.bcrypt = bcrypt
+        self.log_rounds = log_rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self.rejected = 0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherSaturated()
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.rejected += 1
+            raise HasherSaturated() from None
+
+    def hash(self, password):
+        return self._run(self.bcrypt.generate_password_hash, password, self.log_rounds).decode('utf-8')
+
+    def verify(self, pw_hash, password):
+        return self._run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """True when pw_hash was made with a cost other than log_rounds."""
+        try:
+            return int(pw_hash.split('$')[2]) != self.log_rounds
+        except (IndexError, ValueError):
+            return True
+
+class SlidingWindowLimiter:
+    """At most ``limit`` hits per key within ``window`` seconds.
+
+    Keeps a timestamp deque per key; the least recently used keys are
+    dropped past ``max_keys`` so memory stays bounded under spraying.
+    """
+
+    def __init__(self, limit, window, max_keys=100_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Record an attempt. Returns 0 if allowed, else seconds until retry."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+                if len(self._hits) > self.max_keys:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return max(1, int(hits[0] + self.window - now) + 1)
+            hits.append(now)
+            return 0
@@ -0,0 +1,61 @@
+"""Catch table scans and unbounded index walks in the SQL that routes run.
+
+``record_statements`` captures every statement an engine executes while it
+is active. ``scans`` runs each one again under SQLite's ``EXPLAIN QUERY
+PLAN`` and returns the plan steps that read a whole table (``SCAN
+<table>``) or walk a whole index (``SCAN <table> USING INDEX <index>``).
+A walk is only cheap when nothing but LIMIT stops it, e.g. the newest page
+of an unfiltered listing feed, so callers name the indexes they expect to
+walk. Index seeks (``SEARCH``), FTS lookups and scans of subquery results
+are not reported.
+"""
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# "SCAN listing" on SQLite >= 3.36, "SCAN TABLE listing" before it.
+_SCAN_RE = re.compile(r'^SCAN (TABLE )?(?P<name>\S+)( AS \S+)?'
+                      r'( USING (COVERING )?INDEX (?P<index>\S+))?$')
+# Subquery results, which SCAN steps may read without touching a table.
+_SUBQUERY_RE = re.compile(r'^(CO-ROUTINE|MATERIALIZE) (?P<name>\S+)')
+_EXPLAINED = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+@contextmanager
+def record_statements(engine):
+    """Yield a list that fills with (statement, parameters) as SQL runs."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(_EXPLAINED):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def explain(connection, statement, parameters):
+    """The detail column of each EXPLAIN QUERY PLAN row."""
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return [row[3] for row in rows]
+
+def scans(connection, statements, allowed_indexes=()):
+    """(statement, [scan steps]) for every statement whose plan scans a
+    table or walks an index not in allowed_indexes."""
+    found = []
+    for statement, parameters in statements:
+        steps = explain(connection, statement, parameters)
+        subqueries = {m.group('name') for m in map(_SUBQUERY_RE.match, steps) if m}
+        flagged = []
+        for step in steps:
+            match = _SCAN_RE.match(step)
+            if (match is None or match.group('name') in subqueries
+                    or match.group('name').startswith('(')
+                    or match.group('index') in allowed_indexes):
+                continue
+            flagged.append(step)
+        if flagged:
+            found.append((statement, flagged))
+    return found
@@ -0,0 +1,88 @@
+"""Full-text listing search backed by an SQLite FTS5 index.
+
+``listing_fts`` is an external-content FTS5 table over the ``listing`` table,
+so it stores only the inverted index and reads column values from
+``listing`` itself. Triggers keep it in step with every insert, update and
+delete; ``rebuild_search_index`` repopulates it for databases that predate
+the index. Other databases have no FTS5, and ``like_clause`` gives them an
+unranked substring match instead.
+"""
+import re
+
+from sqlalchemy import and_, column, func, literal_column, or_, table, text
+
+FTS_TABLE = 'listing_fts'
+
+# bm25() column weights, in FTS column order: a title hit outranks a
+# category/location hit, which outranks a description hit.
+BM25_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+
+listing_fts = table(FTS_TABLE, column('rowid'))
+
+SCHEMA = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description, category, location,
+        content='listing', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS listing_fts_ai AFTER INSERT ON listing BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, category, location)
+        VALUES (new.id, new.title, new.description, new.category, new.location);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS listing_fts_ad AFTER DELETE ON listing BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, category, location)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.location);
+    END""",
+    # Only edits to indexed columns touch the index; image status, geohash
+    # and other bookkeeping updates skip the delete-and-reinsert.
+    f"""CREATE TRIGGER IF NOT EXISTS listing_fts_au
+        AFTER UPDATE OF title, description, category, location ON listing BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, category, location)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.location);
+        INSERT INTO {FTS_TABLE}(rowid, title, description, category, location)
+        VALUES (new.id, new.title, new.description, new.category, new.location);
+    END""",
+)
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+def init_search_index(connection):
+    """Create the FTS table and its sync triggers if they are missing."""
+    for statement in SCHEMA:
+        connection.execute(text(statement))
+
+def rebuild_search_index(connection):
+    """(Re)create the index and repopulate it from the listing table."""
+    init_search_index(connection)
+    connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+def search_terms(q):
+    return _TERM_RE.findall(q or '')
+
+def build_match_query(q):
+    """Turn free text into an FTS5 query of ANDed prefix terms.
+
+    Each word is quoted so user input can never inject FTS syntax, and
+    suffixed with ``*`` so "carp" matches "carpentry". Returns None when
+    the text has no searchable words.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def match_clause(match_query):
+    return literal_column(FTS_TABLE).op('MATCH')(match_query)
+
+def bm25_rank():
+    """Ranking expression; lower is a better match."""
+    return func.bm25(literal_column(FTS_TABLE), *BM25_WEIGHTS)
+
+def like_clause(terms, columns):
+    """Every term appears, case-insensitively, in at least one of columns.
+
+    Terms are runs of word characters, so ``_`` is the only LIKE wildcard
+    that needs escaping.
+    """
+    patterns = ['%' + term.replace('_', '\\_') + '%' for term in terms]
+    return and_(*(or_(*(col.ilike(pattern, escape='\\') for col in columns)) for pattern in patterns))
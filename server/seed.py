@@ -0,0 +1,139 @@
+"""Populate the database, from a file or with synthetic data.
+
+    python seed.py import listings.ndjson --owner coop@example.com
+    python seed.py import listings.csv --owner coop@example.com --batch-size 1000
+    python seed.py synthetic --users 1000 --listings 1000000
+
+``import`` sends rows through the same validation and batched inserts as
+POST /listings/import; rejected rows are printed with their line numbers.
+
+``synthetic`` generates a reproducible (``--seed``) dataset for the
+benchmarks in bench/. Users are verified, share the password
+``bench-password`` and have emails ``bench-user-<n>@example.com``.
+Rows are written with executemany INSERTs in large batches, so millions of
+listings take minutes, not hours. Set DATABASE_URL to seed a database
+other than the development one.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask_migrate import upgrade
+
+from app import app, db, bcrypt, User, Listing, insert_listings
+import bulk
+import geo
+
+BENCH_PASSWORD = 'bench-password'
+THIKA = (-1.0333, 37.0693)
+LOCATIONS = ('Thika Town', 'Juja', 'Ruiru', 'Makongeni', 'Kiganjo', 'Gatundu', 'Kenol', 'Githurai')
+ADJECTIVES = ('Used', 'New', 'Refurbished', 'Heavy-duty', 'Handmade', 'Solar', 'Portable', 'Custom')
+PRODUCTS = ('inverter', 'water pump', 'welding machine', 'sofa set', 'kiondo basket', 'door frame',
+            'laptop', 'phone screen', 'generator', 'wheelbarrow', 'bed frame', 'tool kit')
+SERVICES = ('plumbing', 'electrical wiring', 'phone repair', 'carpentry', 'tailoring',
+            'motorbike servicing', 'painting', 'welding', 'tiling', 'solar installation')
+
+def bench_email(n):
+    return f"bench-user-{n}@example.com"
+
+def import_file(path, owner_email, batch_size):
+    fmt = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+    owner = User.query.filter_by(email=owner_email).first()
+    if owner is None:
+        sys.exit(f"No user with email {owner_email}")
+    with open(path, 'rb') as stream:
+        report = bulk.import_rows(
+            bulk.parse_rows(stream, fmt),
+            lambda values_list: insert_listings(values_list, owner.id),
+            batch_size=batch_size,
+        )
+    for error in report['errors']:
+        print(f"line {error['line']}: {error['error']}")
+    print(f"Imported {report['imported']} listing(s), {report['failed']} failed.")
+
+def synthetic_listing(rng, first_user_id, user_count, now):
+    if rng.random() < 0.5:
+        category, title = 'Product', f"{rng.choice(ADJECTIVES)} {rng.choice(PRODUCTS)}"
+    else:
+        category, title = 'Service', f"{rng.choice(SERVICES).capitalize()} services"
+    lat = THIKA[0] + rng.gauss(0, 0.15)
+    lng = THIKA[1] + rng.gauss(0, 0.15)
+    return {
+        'title': title,
+        'description': f"{title} available in {rng.choice(LOCATIONS)}. Call or WhatsApp for details.",
+        'price': round(rng.uniform(200, 150_000), -1),
+        'category': category,
+        'location': rng.choice(LOCATIONS),
+        'latitude': lat,
+        'longitude': lng,
+        'geohash': geo.encode(lat, lng),
+        'user_id': first_user_id + rng.randrange(user_count),
+        'created_at': now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+    }
+
+def insert_batches(table, rows, batch_size, label):
+    """Insert an iterable of row dicts in batches, one transaction each."""
+    start, total, batch = time.perf_counter(), 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            total += _flush(table, batch)
+            batch = []
+            print(f"\r{label}: {total:,}", end='', flush=True)
+    if batch:
+        total += _flush(table, batch)
+    print(f"\r{label}: {total:,} in {time.perf_counter() - start:.1f}s")
+
+def _flush(table, batch):
+    with db.engine.begin() as connection:
+        connection.execute(table.insert(), batch)
+    return len(batch)
+
+def seed_synthetic(user_count, listing_count, batch_size, seed):
+    if User.query.filter(User.email.like('bench-user-%')).first():
+        sys.exit("Synthetic users already exist; seed a fresh DATABASE_URL.")
+    rng = random.Random(seed)
+    # One hash for everyone: hashing a million users would dominate the run.
+    password = bcrypt.generate_password_hash(BENCH_PASSWORD).decode('utf-8')
+    first_id = (db.session.execute(db.select(db.func.max(User.id))).scalar() or 0) + 1
+    users = ({
+        'id': first_id + n,
+        'username': f"bench-user-{n}",
+        'email': bench_email(n),
+        'password': password,
+        'phone_number': f"2547{rng.randint(0, 99_999_999):08d}",
+        'is_verified': True,
+    } for n in range(user_count))
+    insert_batches(User.__table__, users, batch_size, "users")
+
+    now = datetime.utcnow()
+    listings = (synthetic_listing(rng, first_id, user_count, now) for _ in range(listing_count))
+    insert_batches(Listing.__table__, listings, batch_size, "listings")
+
+def main():
+    parser = argparse.ArgumentParser(description="Populate the TalaLink database.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="import listings from NDJSON or CSV")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--owner', required=True, help="email of the user who owns the listings")
+    import_parser.add_argument('--batch-size', type=int, default=app.config['BULK_BATCH_SIZE'])
+
+    synthetic_parser = commands.add_parser('synthetic', help="generate benchmark data")
+    synthetic_parser.add_argument('--users', type=int, default=1000)
+    synthetic_parser.add_argument('--listings', type=int, default=100_000)
+    synthetic_parser.add_argument('--batch-size', type=int, default=10_000)
+    synthetic_parser.add_argument('--seed', type=int, default=2026)
+
+    args = parser.parse_args()
+    with app.app_context():
+        upgrade()
+        if args.command == 'import':
+            import_file(args.path, args.owner, args.batch_size)
+        else:
+            seed_synthetic(args.users, args.listings, args.batch_size, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Database engine configuration and read-replica routing.
+
+SQLite files are opened in WAL mode so readers never wait for the single
+writer. ``synchronous=NORMAL`` only syncs at checkpoints, which is still
+crash-safe under WAL. Writers that collide wait for the busy timeout instead
+of failing with "database is locked", and reads come from a memory map.
+Pragmas are per-connection, so they run on every new pooled connection.
+
+For server databases such as PostgreSQL, ``RoutingSession`` sends the reads of
+GET/HEAD requests to a ``replica`` bind when one is configured. Everything
+else goes to the primary: writes, flushes, other methods, views marked
+``@use_primary``, CLI commands, and every read for ``lag_window`` seconds after
+this process last wrote. The response cache is per process, so that window
+stops a lagging replica from refilling the cache with rows just invalidated.
+"""
+import functools
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+def engine_options(url, pool_size, max_overflow, pool_timeout, pool_recycle):
+    """SQLALCHEMY_ENGINE_OPTIONS for the database at url."""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {} # One shared in-memory connection; Flask-SQLAlchemy sets StaticPool
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+    }
+    if url.get_backend_name() != 'sqlite':
+        # Server connections go stale behind proxies and failovers.
+        options.update(pool_pre_ping=True, pool_recycle=pool_recycle)
+    return options
+
+def configure_sqlite(engine, busy_timeout_ms, mmap_size, synchronous='NORMAL', journal_mode='WAL'):
+    """Set the pragmas on each new connection. No-op for other databases."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        cursor.close()
+
+def use_primary(view):
+    """Read from the primary in this view, e.g. a GET that writes."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_use_primary = True
+        return view(*args, **kwargs)
+    return wrapper
+
+class RoutingSession(Session):
+    _last_write = 0.0 # time.monotonic() of this process's last write
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                if self._flushing or getattr(clause, 'is_dml', False):
+                    RoutingSession._last_write = time.monotonic()
+                elif self._reads_from_replica():
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    @staticmethod
+    def _reads_from_replica():
+        if not has_request_context() or request.method not in READ_METHODS:
+            return False
+        if g.get('db_use_primary'):
+            return False
+        lag_window = current_app.config['DATABASE_REPLICA_LAG_WINDOW']
+        return time.monotonic() - RoutingSession._last_write > lag_window
@@ -0,0 +1,50 @@
+"""Shared fixtures: the app bound to a throwaway SQLite file.
+
+The database is created by the Alembic migrations, as in production, and
+seeded once per session with seed.py's synthetic data.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+# app.py reads its configuration at import time.
+_db_dir = tempfile.mkdtemp(prefix='talalink-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'talalink.db')}"
+os.environ['OUTBOX_SENDER'] = '0' # Tests drain the outbox themselves
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as server  # noqa: E402
+import seed  # noqa: E402
+from flask_migrate import upgrade  # noqa: E402
+
+SEED_USERS = 20
+SEED_LISTINGS = 2000
+
+@pytest.fixture(scope='session')
+def app():
+    with server.app.app_context():
+        upgrade()
+        seed.seed_synthetic(SEED_USERS, SEED_LISTINGS, batch_size=1000, seed=2026)
+    return server.app
+
+@pytest.fixture
+def client(app):
+    server.response_cache.clear()
+    return app.test_client()
+
+@pytest.fixture
+def statements(app):
+    """Every statement the primary engine executes during the test."""
+    recorded = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    with app.app_context():
+        engine = server.db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield recorded
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
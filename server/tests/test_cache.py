@@ -0,0 +1,43 @@
+import pytest
+
+import app as server
+import cache
+
+@pytest.mark.parametrize('accept', ['application/json', 'application/x-ndjson'])
+def test_first_response_carries_the_etag(client, accept):
+    headers = {"Accept": accept}
+    first = client.get('/listings?limit=5', headers=headers)
+    assert first.status_code == 200
+    assert first.headers['Content-Type'].startswith(accept)
+    etag = first.headers['ETag']
+    assert etag
+
+    second = client.get('/listings?limit=5', headers=headers)
+    assert second.headers['ETag'] == etag
+    assert second.get_data() == first.get_data()
+
+    revalidated = client.get('/listings?limit=5', headers={**headers, "If-None-Match": etag})
+    assert revalidated.status_code == 304
+
+def test_streamed_miss_answers_if_none_match(client):
+    etag = client.get('/listings?limit=5').headers['ETag']
+    server.response_cache.clear()
+    assert client.get('/listings?limit=5', headers={"If-None-Match": etag}).status_code == 304
+
+def test_compressed_response_keeps_a_weak_etag(client):
+    response = client.get('/listings?limit=50', headers={"Accept-Encoding": "gzip"})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].startswith('W/')
+
+def test_entries_expire_after_ttl(client, monkeypatch):
+    first = client.get('/listings?limit=5')
+    assert first.status_code == 200
+    hits = server.response_cache.hits
+    client.get('/listings?limit=5')
+    assert server.response_cache.hits == hits + 1
+
+    later = cache.time.monotonic() + server.app.config['RESPONSE_CACHE_TTL'] + 1
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: later)
+    misses = server.response_cache.misses
+    client.get('/listings?limit=5')
+    assert server.response_cache.misses == misses + 1
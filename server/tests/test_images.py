@@ -0,0 +1,72 @@
+import io
+import threading
+
+from PIL import Image
+
+import app as server
+import images
+
+def store_png(root, color='teal'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1600, 900), color).save(buffer, 'PNG')
+    buffer.seek(0)
+    digest, relpath, _ = images.store_upload(buffer, 'photo.png', str(root))
+    return digest, relpath
+
+def test_concurrent_jobs_for_one_digest_all_succeed(tmp_path):
+    digest, relpath = store_png(tmp_path)
+    errors = []
+
+    def job():
+        try:
+            images.generate_variants(str(tmp_path / relpath), str(tmp_path), digest)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=job) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert images.variants_exist(str(tmp_path), digest)
+    assert not list((tmp_path / 'variants' / digest).glob('*.part'))
+
+def test_pipeline_runs_one_job_per_digest(tmp_path):
+    digest, relpath = store_png(tmp_path)
+    done, finished = [], threading.Event()
+
+    def on_done(d, ok):
+        done.append((d, ok))
+        finished.set()
+
+    pipeline = images.ImagePipeline(str(tmp_path), max_workers=1)
+    try:
+        assert pipeline.submit(digest, relpath, on_done) is not None
+        assert pipeline.submit(digest, relpath, on_done) is None
+        assert finished.wait(timeout=60)
+    finally:
+        pipeline.shutdown()
+    assert done == [(digest, True)]
+    # Once the job has finished the digest can be submitted again.
+    assert digest not in pipeline._in_flight
+
+def test_failed_job_with_existing_variants_marks_ready(app, tmp_path, monkeypatch):
+    digest, relpath = store_png(tmp_path, color='navy')
+    images.generate_variants(str(tmp_path / relpath), str(tmp_path), digest)
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    with app.app_context():
+        listing = server.db.session.get(server.Listing, 3)
+        original = {"image_hash": listing.image_hash, "image_status": listing.image_status}
+        try:
+            server.db.session.execute(server.db.update(server.Listing).where(server.Listing.id == 3)
+                                      .values(image_hash=digest, image_status=images.STATUS_PENDING))
+            server.db.session.commit()
+            server.on_image_processed(digest, False)
+            status = server.db.session.get(server.Listing, 3).image_status
+        finally:
+            server.db.session.rollback()
+            server.db.session.execute(server.db.update(server.Listing).where(server.Listing.id == 3)
+                                      .values(**original))
+            server.db.session.commit()
+    assert status == images.STATUS_READY
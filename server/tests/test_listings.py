@@ -0,0 +1,38 @@
+import pytest
+
+import app as server
+
+@pytest.mark.parametrize('limit', [1, 20, 100])
+def test_listings_page_is_one_statement(client, statements, limit):
+    response = client.get(f'/listings?limit={limit}')
+    assert len(response.get_json()) == limit
+    assert len(statements) == 1, statements
+
+def test_listing_detail_is_one_statement(client, statements):
+    response = client.get('/listings/1')
+    assert response.status_code == 200
+    assert response.get_json()['id'] == 1
+    assert len(statements) == 1, statements
+
+def test_cursor_pages_do_not_overlap(client):
+    first = client.get('/listings?limit=50')
+    first_ids = [item['id'] for item in first.get_json()]
+    second = client.get(f"/listings?limit=50&cursor={first.headers['X-Next-Cursor']}")
+    second_ids = [item['id'] for item in second.get_json()]
+    assert len(second_ids) == 50
+    assert not set(first_ids) & set(second_ids)
+
+def test_narrow_price_range_seeks_the_price_index(client, statements):
+    response = client.get('/listings?min_price=149000')
+    assert response.status_code == 200
+    assert len(statements) == 2 # The capped count, then the page
+    assert '+ listing.created_at' in statements[-1]
+
+def test_price_planner_hint_is_sqlite_only(app, client, statements, monkeypatch):
+    with app.app_context():
+        dialect = server.db.engine.dialect
+    monkeypatch.setattr(dialect, 'name', 'postgresql')
+    response = client.get('/listings?min_price=149000')
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert '+ listing' not in statements[0]
@@ -0,0 +1,43 @@
+import re
+
+from flask import Flask
+
+from metrics import Metrics
+
+def sample(text, name, labels):
+    match = re.search(rf'^{re.escape(name)}{{{re.escape(labels)}}} (\S+)$', text, re.MULTILINE)
+    assert match, f"{name}{{{labels}}} not in /metrics"
+    return float(match.group(1))
+
+def test_scrape_counts_the_request_and_its_sql(client):
+    client.get('/listings?limit=5&_=metrics').get_data()
+    text = client.get('/metrics').get_data(as_text=True)
+    labels = 'endpoint="get_listings",method="GET"'
+    assert sample(text, 'talalink_http_request_duration_seconds_bucket', labels + ',le="+Inf"') >= 1
+    assert sample(text, 'talalink_http_request_duration_seconds_count', labels) >= 1
+    assert sample(text, 'talalink_http_responses_total', labels + ',status="200"') >= 1
+    assert sample(text, 'talalink_sql_statements_total', 'endpoint="get_listings"') >= 1
+
+def profiled_app(tmp_path, **options):
+    app = Flask(__name__)
+    Metrics(app, [], profile_dir=str(tmp_path), **options)
+    app.add_url_rule('/ping', 'ping', lambda: 'pong')
+    return app.test_client()
+
+def test_profile_header_needs_the_token(tmp_path):
+    client = profiled_app(tmp_path, profile_token='s3cret')
+    client.get('/ping', headers={"X-Profile": "1"})
+    assert list(tmp_path.glob('*.prof')) == []
+    client.get('/ping', headers={"X-Profile": "s3cret"})
+    assert len(list(tmp_path.glob('*.prof'))) == 1
+
+def test_profile_header_is_ignored_without_a_token(tmp_path):
+    client = profiled_app(tmp_path)
+    client.get('/ping', headers={"X-Profile": "1"})
+    assert list(tmp_path.glob('*.prof')) == []
+
+def test_only_the_newest_profiles_are_kept(tmp_path):
+    client = profiled_app(tmp_path, profile_sample_rate=1.0, profile_max_files=3)
+    for _ in range(6):
+        client.get('/ping')
+    assert len(list(tmp_path.glob('*.prof'))) == 3
@@ -0,0 +1,88 @@
+"""Migrating databases built before the Alembic history covered the schema."""
+import os
+import sqlite3
+import subprocess
+import sys
+
+from sqlalchemy import text
+
+import app as server
+import search
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What db.create_all() built before listings had coordinates, image
+# variants or any of the later tables.
+CREATE_ALL_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER NOT NULL PRIMARY KEY,
+    username VARCHAR(80) NOT NULL UNIQUE,
+    email VARCHAR(120) NOT NULL UNIQUE,
+    password VARCHAR(200) NOT NULL,
+    phone_number VARCHAR(20),
+    is_verified BOOLEAN,
+    verification_token VARCHAR(100) UNIQUE
+);
+CREATE TABLE listing (
+    id INTEGER NOT NULL PRIMARY KEY,
+    title VARCHAR(100) NOT NULL,
+    description TEXT NOT NULL,
+    price FLOAT NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    location VARCHAR(100),
+    image_url VARCHAR(500),
+    user_id INTEGER NOT NULL REFERENCES user (id),
+    created_at DATETIME
+);
+INSERT INTO user (id, username, email, password) VALUES (1, 'wanjiku', 'wanjiku@example.com', '-');
+INSERT INTO listing (id, title, description, price, category, location, user_id, created_at)
+VALUES (1, 'Welding machine', 'Barely used', 18000, 'Product', 'Juja', 1, '2026-01-05 09:00:00');
+"""
+
+def test_upgrade_adds_columns_to_create_all_database(tmp_path):
+    path = tmp_path / 'legacy.db'
+    with sqlite3.connect(path) as connection:
+        connection.executescript(CREATE_ALL_SCHEMA)
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade'],
+                   cwd=SERVER_DIR, env=env, check=True, capture_output=True)
+
+    with sqlite3.connect(path) as connection:
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(listing)")}
+        indexes = {row[1] for row in connection.execute("PRAGMA index_list(listing)")}
+        found = connection.execute(
+            "SELECT rowid FROM listing_fts WHERE listing_fts MATCH 'welding'").fetchall()
+    assert {'latitude', 'longitude', 'geohash', 'image_hash', 'image_status'} <= columns
+    assert {'ix_listing_geohash_latitude_longitude', 'ix_listing_created_at_id', 'ix_listing_price'} <= indexes
+    assert found == [(1,)]
+
+def test_migrated_search_triggers_match_search_module(app):
+    """The revisions inline their DDL; they must still end where search.py is."""
+    def normalize(sql):
+        return ' '.join(sql.replace('IF NOT EXISTS ', '').split())
+
+    with app.app_context():
+        migrated = server.db.session.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'listing'")).scalars()
+        migrated = {normalize(sql) for sql in migrated}
+    expected = {normalize(sql) for sql in search.SCHEMA if 'CREATE TRIGGER' in sql}
+    assert migrated == expected
+
+def test_deleting_a_listing_keeps_its_conversations(app):
+    """With foreign keys enforced, the conversation survives and loses its listing."""
+    with app.app_context():
+        path = server.db.engine.url.database
+    with sqlite3.connect(path) as connection:
+        connection.execute("PRAGMA foreign_keys = ON")
+        listing_id = connection.execute(
+            "INSERT INTO listing (title, description, price, category, user_id) "
+            "VALUES ('Jiko', 'Charcoal stove', 900, 'Product', 2)").lastrowid
+        conversation_id = connection.execute(
+            "INSERT INTO conversation (listing_id, buyer_id, seller_id) VALUES (?, 1, 2)",
+            (listing_id,)).lastrowid
+        connection.execute("DELETE FROM listing WHERE id = ?", (listing_id,))
+        row = connection.execute(
+            "SELECT listing_id FROM conversation WHERE id = ?", (conversation_id,)).fetchone()
+        connection.execute("DELETE FROM conversation WHERE id = ?", (conversation_id,))
+    assert row == (None,)
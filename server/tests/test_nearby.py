@@ -0,0 +1,50 @@
+import math
+import random
+
+import pytest
+
+import app as server
+import geo
+import seed
+
+def brute_force(lat, lng, radius_km, limit):
+    rows = server.db.session.execute(
+        server.db.select(server.Listing.id, server.Listing.latitude, server.Listing.longitude)
+        .where(server.Listing.latitude.is_not(None))
+    ).all()
+    matches = sorted((geo.haversine_km(lat, lng, a, b), listing_id) for listing_id, a, b in rows)
+    return [listing_id for distance, listing_id in matches if distance <= radius_km][:limit]
+
+@pytest.mark.parametrize('centre', [seed.THIKA, (-1.2921, 36.8219), (-0.9, 37.4), (0.5, 38.0)])
+@pytest.mark.parametrize('radius_km', [0.5, 5, 20, 100])
+def test_find_nearby_matches_brute_force(app, centre, radius_km):
+    with app.app_context():
+        found = server.find_nearby(server.db.session, *centre, radius_km, limit=20)
+        assert [row['id'] for distance, row in found] == brute_force(*centre, radius_km, 20)
+        assert [distance for distance, row in found] == sorted(distance for distance, row in found)
+
+def test_dense_area_stops_at_a_small_ring(app, statements):
+    rings = list(geo.ring_radii(100, app.config['NEARBY_FIRST_RING_KM']))
+    with app.app_context():
+        found = server.find_nearby(server.db.session, *seed.THIKA, 100, limit=5)
+    assert len(found) == 5
+    # One query per ring searched; the seeded town fills a page long before 100 km.
+    assert len(statements) < len(rings)
+    assert found[-1][0] <= rings[len(statements) - 1]
+
+def test_covering_cells_contain_the_circle():
+    rng = random.Random(7)
+    for _ in range(500):
+        lat, lng = rng.uniform(-80, 80), rng.uniform(-180, 180)
+        radius_km = rng.choice([0.2, 2, 25, 100])
+        cells = geo.covering_cells(lat, lng, radius_km)
+        assert len(cells) <= geo.MAX_COVERING_CELLS
+        for bearing in range(0, 360, 15):
+            # A point on the circle, slightly inside it.
+            d = radius_km * 0.999 / geo.KM_PER_DEGREE
+            point_lat = lat + d * math.cos(math.radians(bearing))
+            point_lng = lng + d * math.sin(math.radians(bearing)) / math.cos(math.radians(point_lat))
+            point_lng = (point_lng + 540.0) % 360.0 - 180.0
+            if geo.haversine_km(lat, lng, point_lat, point_lng) > radius_km:
+                continue
+            assert any(geo.encode(point_lat, point_lng).startswith(cell) for cell in cells)
@@ -0,0 +1,49 @@
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import app as server
+import outbox
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, smtp_server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def smtp_server(app, monkeypatch):
+    """A local SMTP server that app.mail delivers to, with the app's other mail settings."""
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    config = dict(app.config, MAIL_SERVER=controller.hostname, MAIL_PORT=controller.port,
+                  MAIL_USE_TLS=False)
+    monkeypatch.setitem(app.extensions, 'mail', server.mail.init_mail(config))
+    yield handler
+    controller.stop()
+
+def test_signup_email_is_delivered(client, app, smtp_server):
+    response = client.post('/signup', json={
+        "username": "kamau", "email": "kamau@example.com", "password": "pump-and-pipe"})
+    assert response.status_code == 201
+
+    with app.app_context():
+        assert server.outbox_sender.drain_once() == 1
+        row = server.db.session.execute(
+            server.db.select(server.OutboxEmail).where(server.OutboxEmail.recipient == 'kamau@example.com')
+        ).scalar_one()
+        assert row.status == outbox.STATUS_SENT
+
+    [envelope] = smtp_server.messages
+    assert envelope.rcpt_tos == ['kamau@example.com']
+    assert envelope.mail_from == app.config['MAIL_DEFAULT_SENDER']
+    assert b'Verify your account here' in envelope.content
@@ -0,0 +1,12 @@
+from flask_bcrypt import Bcrypt
+
+from passwords import PasswordHasher
+
+def test_needs_rehash_compares_against_configured_rounds():
+    bcrypt = Bcrypt()
+    hasher = PasswordHasher(bcrypt, log_rounds=5, workers=1)
+    current = hasher.hash('correct horse')
+    assert current.startswith('$2b$05$')
+    assert not hasher.needs_rehash(current)
+    assert hasher.needs_rehash(bcrypt.generate_password_hash('correct horse', 4).decode('utf-8'))
+    assert hasher.needs_rehash('not-a-bcrypt-hash')
@@ -0,0 +1,92 @@
+"""EXPLAIN the SQL behind each read route and fail on scans.
+
+A route may walk an index only where nothing but LIMIT bounds the walk; each
+case names the indexes it is allowed to walk.
+"""
+import secrets
+from datetime import datetime
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+import app as server
+import queryplan
+
+BUYER_ID = 1
+NEWEST_FIRST = ('ix_listing_created_at_id',)
+
+@pytest.fixture(scope='module')
+def conversation_id(app):
+    with app.app_context():
+        listing_id = server.db.session.execute(
+            server.db.select(server.Listing.id).where(server.Listing.user_id != BUYER_ID)
+        ).scalars().first()
+        token = create_access_token(identity=str(BUYER_ID))
+    client = app.test_client()
+    auth = {"Authorization": f"Bearer {token}"}
+    conversation = client.post('/conversations', json={"listing_id": listing_id}, headers=auth).get_json()
+    for n in range(3):
+        client.post(f"/conversations/{conversation['id']}/messages", json={"body": f"Still available? {n}"},
+                    headers=auth)
+    return conversation['id']
+
+@pytest.fixture
+def auth(app):
+    server.identity_cache.invalidate(BUYER_ID) # So /profile reaches the database
+    with app.app_context():
+        return {"Authorization": f"Bearer {create_access_token(identity=str(BUYER_ID))}"}
+
+def cursor():
+    return server.encode_cursor(datetime.utcnow(), 1)
+
+CASES = [
+    # (method, path, json, authenticated, walks allowed)
+    ('GET', '/listings', None, False, NEWEST_FIRST),
+    ('GET', '/listings?category=Product', None, False, ()),
+    ('GET', '/listings?location=Juja', None, False, ()),
+    ('GET', '/listings?cursor={cursor}', None, False, ()),
+    ('GET', '/listings?category=Service&cursor={cursor}', None, False, ()),
+    ('GET', '/listings?location=Ruiru&cursor={cursor}', None, False, ()),
+    # Narrow price ranges seek ix_listing_price...
+    ('GET', '/listings?min_price=149000', None, False, ()),
+    ('GET', '/listings?max_price=1000', None, False, ()),
+    ('GET', '/listings?min_price=20000&max_price=20500', None, False, ()),
+    ('GET', '/listings?min_price=149000&cursor={cursor}', None, False, ()),
+    ('GET', '/listings?category=Product&min_price=149000', None, False, ()),
+    # ...wide ones match most rows, so the newest-first walk fills a page early.
+    ('GET', '/listings?min_price=1000', None, False, NEWEST_FIRST),
+    ('GET', '/listings/search?q=pump', None, False, ()),
+    ('GET', '/listings/search?q=pump&category=Product', None, False, ()),
+    ('GET', '/listings/nearby?lat=-1.0333&lng=37.0693', None, False, ()),
+    ('GET', '/listings/1', None, False, ()),
+    ('GET', f'/listings/export?user_id={BUYER_ID}', None, False, ()),
+    ('GET', f'/verify/{secrets.token_urlsafe(32)}', None, False, ()),
+    ('POST', '/login', {"email": "nobody@example.invalid", "password": "-"}, False, ()),
+    ('GET', '/profile', None, True, ()),
+    ('GET', '/conversations', None, True, ()),
+    ('GET', '/conversations/{conversation_id}/messages', None, True, ()),
+]
+
+@pytest.mark.parametrize('method, path, body, authenticated, allowed', CASES,
+                         ids=[f'{method} {path}' for method, path, *_ in CASES])
+def test_route_does_not_scan(app, client, auth, conversation_id, method, path, body, authenticated, allowed):
+    path = path.format(cursor=cursor(), conversation_id=conversation_id)
+    with app.app_context():
+        engine = server.db.engine
+    with queryplan.record_statements(engine) as statements:
+        response = client.open(path, method=method, json=body, headers=auth if authenticated else None)
+        response.get_data() # Drain streamed bodies
+    assert response.status_code < 500
+    assert statements, f"{method} {path} ran no SQL"
+    with engine.connect() as connection:
+        assert queryplan.scans(connection, statements, allowed) == []
+
+def test_scans_flags_filtered_index_walk(app):
+    # What /listings?min_price=... ran before it learned to seek the price index.
+    statement = ("SELECT id FROM listing WHERE price >= ? "
+                 "ORDER BY created_at DESC, id DESC LIMIT 21")
+    with app.app_context(), server.db.engine.connect() as connection:
+        found = queryplan.scans(connection, [(statement, (149000.0,))])
+        assert found == [(statement, ['SCAN listing USING INDEX ix_listing_created_at_id'])]
+        assert queryplan.scans(connection, [(statement, (149000.0,))], NEWEST_FIRST) == []
+        assert queryplan.scans(connection, [("SELECT * FROM listing WHERE description LIKE '%pump%'", ())])
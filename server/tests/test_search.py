@@ -0,0 +1,44 @@
+from sqlalchemy import text
+
+import app as server
+
+def search_ids(client, q):
+    return [item['id'] for item in client.get(f'/listings/search?q={q}&limit=100').get_json()]
+
+def test_title_edit_is_reindexed(client, app):
+    with app.app_context():
+        title = server.db.session.get(server.Listing, 7).title
+        set_title = text("UPDATE listing SET title = :title WHERE id = 7")
+        server.db.session.execute(set_title, {"title": 'Zanzibar chest'})
+        server.db.session.commit()
+        try:
+            assert search_ids(client, 'zanzibar') == [7]
+        finally:
+            # The seeded database is shared by the whole session.
+            server.db.session.execute(set_title, {"title": title})
+            server.db.session.commit()
+    server.response_cache.clear()
+    assert search_ids(client, 'zanzibar') == []
+
+def test_bookkeeping_updates_skip_the_index(app):
+    with app.app_context():
+        connection = server.db.session.connection()
+        segments = "SELECT count(*) FROM listing_fts_data"
+        before = connection.execute(text(segments)).scalar()
+        try:
+            connection.execute(text("UPDATE listing SET image_status = 'ready', geohash = 'kzf0' WHERE id <= 50"))
+            assert connection.execute(text(segments)).scalar() == before
+        finally:
+            server.db.session.rollback()
+
+def test_search_falls_back_to_substring_matching_off_sqlite(app, client, statements, monkeypatch):
+    with app.app_context():
+        dialect = server.db.engine.dialect
+    monkeypatch.setattr(dialect, 'name', 'postgresql')
+    response = client.get('/listings/search?q=pump&limit=100')
+    assert response.status_code == 200
+    items = response.get_json()
+    assert items
+    assert all('pump' in ' '.join(str(item[key]) for key in ('title', 'description', 'category', 'location')).lower()
+               for item in items)
+    assert 'listing_fts' not in statements[-1]
@@ -0,0 +1,120 @@
+import threading
+import time
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import app as server
+import storage
+
+READERS = 8
+READS_PER_THREAD = 25
+
+def sqlite_engine(path, journal_mode, busy_timeout_ms):
+    url = f"sqlite:///{path}"
+    engine = create_engine(url, connect_args={'timeout': busy_timeout_ms / 1000},
+                           **storage.engine_options(url, pool_size=READERS, max_overflow=4,
+                                                    pool_timeout=10, pool_recycle=1800))
+    storage.configure_sqlite(engine, busy_timeout_ms=busy_timeout_ms, mmap_size=1024 * 1024,
+                             journal_mode=journal_mode)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("INSERT INTO item (name) VALUES ('pump'), ('sofa'), ('inverter')"))
+    return engine
+
+def read_while_writing(engine):
+    """Hold an exclusive write transaction while threads read. Returns (counts, errors)."""
+    counts, errors = [], []
+
+    def reader():
+        try:
+            for _ in range(READS_PER_THREAD):
+                with engine.connect() as connection:
+                    counts.append(connection.execute(text("SELECT count(*) FROM item")).scalar())
+        except OperationalError as e:
+            errors.append(e)
+
+    writer = engine.raw_connection()
+    try:
+        cursor = writer.cursor()
+        cursor.execute("BEGIN EXCLUSIVE")
+        cursor.execute("INSERT INTO item (name) VALUES ('generator')")
+        threads = [threading.Thread(target=reader) for _ in range(READERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        writer.commit()
+    finally:
+        writer.close()
+    return counts, errors
+
+def test_wal_readers_progress_during_a_write(tmp_path):
+    engine = sqlite_engine(tmp_path / 'wal.db', 'WAL', busy_timeout_ms=5000)
+    start = time.monotonic()
+    counts, errors = read_while_writing(engine)
+    elapsed = time.monotonic() - start
+    assert errors == []
+    # Every read finished while the write was still open, against the
+    # last committed snapshot, without waiting out the busy timeout.
+    assert counts == [3] * (READERS * READS_PER_THREAD)
+    assert elapsed < 5
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM item")).scalar() == 4
+    engine.dispose()
+
+def test_rollback_journal_readers_are_locked_out(tmp_path):
+    # The same workload without WAL, as a check that the test above can fail.
+    engine = sqlite_engine(tmp_path / 'journal.db', 'DELETE', busy_timeout_ms=0)
+    counts, errors = read_while_writing(engine)
+    assert errors and all('database is locked' in str(e) for e in errors)
+    engine.dispose()
+
+def test_pragmas_are_applied_to_each_connection(tmp_path):
+    engine = sqlite_engine(tmp_path / 'pragmas.db', 'WAL', busy_timeout_ms=1234)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == 'wal'
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1 # NORMAL
+    engine.dispose()
+
+def test_listing_reads_succeed_while_listings_are_posted(app):
+    """The bench.concurrency mix, in-process: POST /listings alongside GET /listings."""
+    with app.app_context():
+        auth = {"Authorization": f"Bearer {create_access_token(identity='2')}"}
+    statuses, lock = [], threading.Lock()
+
+    def record(status):
+        with lock:
+            statuses.append(status)
+
+    def writer(n):
+        client = app.test_client()
+        for i in range(10):
+            record(client.post('/listings', headers=auth, data={
+                "title": f"Concurrent write {n}-{i}", "description": "Written by test_storage",
+                "price": "100", "category": "Product", "location": "Thika Town",
+            }).status_code)
+
+    def reader(n):
+        client = app.test_client()
+        for i in range(20):
+            response = client.get(f'/listings?limit=20&_={n}-{i}')
+            response.get_data()
+            record(response.status_code)
+
+    threads = ([threading.Thread(target=writer, args=(n,)) for n in range(2)]
+               + [threading.Thread(target=reader, args=(n,)) for n in range(4)])
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+    finally:
+        with app.app_context():
+            server.db.session.execute(text("DELETE FROM listing WHERE title LIKE 'Concurrent write %'"))
+            server.db.session.commit()
+        server.response_cache.clear()
+    assert sorted(set(statuses)) == [200, 201]
+    assert statuses.count(201) == 20 and statuses.count(200) == 80